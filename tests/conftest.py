@@ -33,6 +33,20 @@ assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts'])
     'Пожалуйста зарегистрируйте приложение в `settings.INSTALLED_APPS`'
 )
 
+import pytest
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache(tmp_path_factory):
+    """Кэш тестов во временном файле, а не общий файл сервера."""
+    from core.testing import isolated_caches
+    from django.test import override_settings
+
+    directory = str(tmp_path_factory.mktemp('cache'))
+    with override_settings(CACHES=isolated_caches(directory)):
+        yield
+
+
 pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
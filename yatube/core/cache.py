@@ -0,0 +1,244 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+# Ограничение SQLite на число параметров в одном запросе.
+MAX_VARIABLES = 500
+
+
+class SQLiteCache(BaseCache):
+    """Общий для всех процессов узла кэш в файле SQLite в режиме WAL.
+
+    Каждый процесс и поток открывает своё соединение к одному файлу,
+    поэтому сброс ключа в одном воркере виден всем остальным. Вытесняет
+    давно не читавшиеся записи (LRU), когда их больше MAX_ENTRIES.
+    Целые числа хранятся как INTEGER, и incr выполняется одним UPDATE.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = os.path.abspath(location)
+        options = params.get('OPTIONS', {})
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5)
+        self._touch_interval = options.get('TOUCH_INTERVAL', 60)
+        self._cull_every = options.get('CULL_CHECK_EVERY', 100)
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            db = sqlite3.connect(
+                self._path,
+                timeout=self._busy_timeout,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = pid
+        return self._local.db
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return sqlite3.Binary(pickle.dumps(value, self.pickle_protocol))
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        now = time.time()
+        names = list(keys)
+        found, stale = {}, []
+        for start in range(0, len(names), MAX_VARIABLES):
+            chunk = names[start:start + MAX_VARIABLES]
+            rows = self._db.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                chunk
+            ).fetchall()
+            for name, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[keys[name]] = self._decode(value)
+                if now - accessed > self._touch_interval:
+                    stale.append(name)
+        if stale:
+            self._db.executemany(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                [(now, name) for name in stale]
+            )
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        rows = [
+            (self._key(key, version), self._encode(value), expires, now)
+            for key, value in data.items()
+        ]
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                rows
+            )
+        self._maybe_cull(len(rows))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        name = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (name, now)
+            )
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)',
+                (name, self._encode(value), self.get_backend_timeout(timeout),
+                 now)
+            ).rowcount
+        self._maybe_cull(added)
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        name = self._key(key, version)
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                'UPDATE cache SET value = value + ?, accessed = ? '
+                'WHERE key = ? AND typeof(value) = \'integer\' '
+                'AND (expires IS NULL OR expires > ?) RETURNING value',
+                (delta, now, name, now)
+            ).fetchone()
+            if row is None:
+                current = db.execute(
+                    'SELECT value FROM cache '
+                    'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                    (name, now)
+                ).fetchone()
+                if current is None:
+                    raise ValueError("Key '%s' not found" % key)
+                value = self._decode(current[0]) + delta
+                db.execute(
+                    'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                    (self._encode(value), now, name)
+                )
+                return value
+        return row[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        return bool(self._db.execute(
+            'UPDATE cache SET expires = ?, accessed = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now,
+             self._key(key, version), now)
+        ).rowcount)
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            'SELECT 1 FROM cache '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        names = [self._key(key, version) for key in keys]
+        with self._transaction() as db:
+            for start in range(0, len(names), MAX_VARIABLES):
+                chunk = names[start:start + MAX_VARIABLES]
+                db.execute(
+                    'DELETE FROM cache '
+                    f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                    chunk
+                )
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединения живут весь срок жизни потока: SQLite-файл локален,
+        # и переоткрывать его на каждый запрос дороже, чем держать.
+        pass
+
+    def _transaction(self):
+        return _Immediate(self._db)
+
+    def _maybe_cull(self, written):
+        self._writes += written
+        if self._writes < self._cull_every:
+            return
+        self._writes = 0
+        self._cull()
+
+    def _cull(self):
+        now = time.time()
+        with self._transaction() as db:
+            db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+            count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count <= self._max_entries:
+                return
+            excess = count - self._max_entries
+            if self._cull_frequency:
+                excess = max(excess, count // self._cull_frequency)
+            db.execute(
+                'DELETE FROM cache WHERE key IN '
+                '(SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (excess,)
+            )
+
+
+class _Immediate:
+    """BEGIN IMMEDIATE: блокировка записи берётся сразу, без гонки."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        return self.db
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.db.execute('ROLLBACK' if exc_type else 'COMMIT')
@@ -0,0 +1,80 @@
+"""Профиль SQLite для продакшена.
+
+Прагмы из SQLITE_PRAGMAS применяются к каждому новому соединению.
+Движок core.db (модуль base) открывает транзакции через BEGIN
+IMMEDIATE, а retry_locked повторяет запись, которой не хватило
+блокировки.
+"""
+import random
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def pragmas(settings_dict=None):
+    """Прагмы профиля; PRAGMAS в настройках базы дополняют общие."""
+    values = {
+        **settings.SQLITE_PRAGMAS,
+        **(settings_dict or {}).get('PRAGMAS', {}),
+    }
+    return [f'PRAGMA {name}={value}' for name, value in values.items()]
+
+
+@receiver(connection_created)
+def configure(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma in pragmas(connection.settings_dict):
+            cursor.execute(pragma)
+
+
+def is_locked(error) -> bool:
+    return 'locked' in str(error) or 'busy' in str(error)
+
+
+def backoff(attempt) -> float:
+    """Пауза перед повтором: случайная в пределах растущего окна, чтобы
+    столкнувшиеся писатели не пришли снова одновременно."""
+    return random.uniform(0, settings.SQLITE_RETRY_DELAY * 2 ** attempt)
+
+
+def retry_locked(func, using=('default',)):
+    """Выполняет функцию в транзакции на каждой базе из using и
+    повторяет её, если база оказалась заблокирована дольше busy_timeout.
+
+    BEGIN IMMEDIATE берёт блокировку на запись сразу, поэтому
+    оборачивается только сама запись: retry_locked(post.save)(), а не
+    вся view с проверкой формы, обработкой картинок и шаблоном. Повтор
+    выполняет функцию заново, так что побочных эффектов вне базы
+    в ней быть не должно. Запись, которая задевает несколько баз
+    (пост на шарде и счётчики в default), передаёт их все в using:
+    иначе повтор оставил бы на одной из них половину записи.
+
+    Внутри уже открытой транзакции повторять нечего: её откатит тот,
+    кто её открыл, поэтому там функция выполняется один раз.
+    """
+    aliases = tuple(dict.fromkeys(using))
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        nested = any(
+            connections[alias].in_atomic_block for alias in aliases
+        )
+        attempts = 1 if nested else settings.SQLITE_WRITE_RETRIES
+        for attempt in range(attempts):
+            try:
+                with ExitStack() as stack:
+                    for alias in aliases:
+                        stack.enter_context(transaction.atomic(using=alias))
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if not is_locked(error) or attempt == attempts - 1:
+                    raise
+            time.sleep(backoff(attempt))
+    return wrapper
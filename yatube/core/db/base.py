@@ -0,0 +1,30 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, в котором транзакция сразу берёт блокировку на запись.
+
+    При обычном BEGIN транзакция начинает с чтения и повышает блокировку
+    только на первой записи; если в этот момент пишет другое соединение,
+    SQLite отвечает «database is locked» сразу, не дожидаясь
+    busy_timeout. BEGIN IMMEDIATE встаёт в очередь писателей в начале
+    транзакции, где ожидание busy_timeout работает.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
+
+    @property
+    def references_elsewhere(self) -> bool:
+        """Внешние ключи ведут в другую базу (шарды): SQLite не может
+        их проверить, целостность держит приложение."""
+        pragmas = self.settings_dict.get('PRAGMAS', {})
+        return str(pragmas.get('foreign_keys', '')).upper() == 'OFF'
+
+    def enable_constraint_checking(self):
+        if not self.references_elsewhere:
+            super().enable_constraint_checking()
+
+    def check_constraints(self, table_names=None):
+        if not self.references_elsewhere:
+            super().check_constraints(table_names)
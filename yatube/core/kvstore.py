@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+EMPTY_VALUE = cached_db_kvstore.EMPTY_VALUE
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """KVStore sorl-thumbnail с памятью процесса перед кэшем и БД.
+
+    Запись идёт сквозь все три уровня. В памяти хранятся только
+    найденные значения и не дольше THUMBNAIL_MEMORY_TIMEOUT: миниатюра,
+    созданная другим процессом, появится без перезапуска.
+    get_many читает сразу много ключей одним get_many кэша и одним
+    запросом IN к thumbnail_kvstore.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = (
+                value, time.monotonic() + settings.THUMBNAIL_MEMORY_TIMEOUT
+            )
+            self._memory.move_to_end(key)
+            while len(self._memory) > settings.THUMBNAIL_MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _recall(self, key):
+        with self._lock:
+            value, expires = self._memory.get(key, (None, 0))
+            if expires <= time.monotonic():
+                self._memory.pop(key, None)
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _forget(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+
+    def _get_raw(self, key):
+        value = self._recall(key)
+        if value is None:
+            value = super()._get_raw(key)
+            if value is not None:
+                self._remember(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self._remember(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self._forget(*keys)
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def clear(self, delete_thumbnails=False):
+        super().clear(delete_thumbnails)
+        self.clear_memory()
+
+    def get_many_raw(self, keys):
+        found, missing = {}, []
+        for key in dict.fromkeys(keys):
+            value = self._recall(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            cached = self.cache.get_many(missing)
+            missing = [key for key in missing if key not in cached]
+            if missing:
+                stored = dict(
+                    KVStoreModel.objects.filter(
+                        key__in=missing
+                    ).values_list('key', 'value')
+                )
+                filled = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+                self.cache.set_many(
+                    filled, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+                )
+                cached.update(filled)
+            for key, value in cached.items():
+                if value != EMPTY_VALUE:
+                    found[key] = value
+                    self._remember(key, value)
+        return found
+
+    def get_many(self, image_files):
+        """Словарь {image_file.key: ImageFile} для найденных в хранилище."""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in self.get_many_raw(keys).items()
+        }
@@ -0,0 +1,153 @@
+import json
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+from . import tasks
+from .models import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Почтовый бэкенд, который не отправляет письма, а кладёт их
+    в таблицу исходящих.
+
+    Запрос тратит на письмо одну вставку; доставкой занимается задача
+    deliver в воркере. Вложения не сохраняются: сайт их не отправляет.
+    """
+
+    def send_messages(self, email_messages):
+        now = timezone.now()
+        rows = [
+            OutboxMessage(
+                subject=message.subject,
+                body=message.body,
+                from_email=message.from_email,
+                payload=json.dumps({
+                    'to': list(message.to),
+                    'cc': list(message.cc),
+                    'bcc': list(message.bcc),
+                    'reply_to': list(message.reply_to),
+                    'headers': message.extra_headers,
+                    'alternatives': [
+                        list(alternative) for alternative
+                        in getattr(message, 'alternatives', ())
+                    ],
+                }),
+                next_attempt=now,
+            )
+            for message in email_messages
+            if message.recipients()
+        ]
+        OutboxMessage.objects.bulk_create(rows)
+        if rows:
+            # Без ключа: иначе новое письмо ждало бы отложенного повтора.
+            # Дважды письмо не уйдёт, пачки захватываются в _claim.
+            deliver.enqueue()
+        return len(rows)
+
+
+def _message(row):
+    payload = json.loads(row.payload)
+    message = EmailMultiAlternatives(
+        row.subject,
+        row.body,
+        row.from_email,
+        to=payload['to'],
+        cc=payload['cc'],
+        bcc=payload['bcc'],
+        reply_to=payload['reply_to'],
+        headers=payload['headers'],
+    )
+    for content, mimetype in payload['alternatives']:
+        message.attach_alternative(content, mimetype)
+    return message
+
+
+def _claim():
+    """Забирает пачку готовых писем, чтобы их не отправил кто-то ещё."""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    due = OutboxMessage.objects.filter(
+        failed__isnull=True, next_attempt__lte=now
+    ).order_by('next_attempt').values_list('pk', flat=True)
+    OutboxMessage.objects.filter(
+        pk__in=list(due[:settings.OUTBOX_BATCH_SIZE]),
+        next_attempt__lte=now,
+    ).update(
+        claimed_by=token,
+        next_attempt=now + timedelta(seconds=settings.OUTBOX_LEASE),
+    )
+    return list(OutboxMessage.objects.filter(claimed_by=token))
+
+
+def _failed(row, error):
+    row.attempts += 1
+    changes = {'attempts': row.attempts, 'error': error, 'claimed_by': ''}
+    if row.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        changes['failed'] = timezone.now()
+    else:
+        changes['next_attempt'] = timezone.now() + timedelta(
+            seconds=tasks.backoff(row.attempts)
+        )
+    OutboxMessage.objects.filter(pk=row.pk).update(**changes)
+
+
+def send_batch(rows):
+    """Отправляет пачку через одно соединение не быстрее OUTBOX_RATE
+    писем в секунду. Возвращает число доставленных."""
+    connection = get_connection(settings.OUTBOX_EMAIL_BACKEND)
+    try:
+        connection.open()
+    except Exception as error:
+        logger.warning('Почтовый сервер недоступен: %s', error)
+        for row in rows:
+            _failed(row, str(error))
+        return 0
+    sent = []
+    started = time.monotonic()
+    try:
+        for index, row in enumerate(rows):
+            pause = started + index / settings.OUTBOX_RATE - time.monotonic()
+            if pause > 0:
+                time.sleep(pause)
+            try:
+                message = _message(row)
+                message.connection = connection
+                message.send()
+            except Exception as error:
+                logger.warning('Письмо %s не отправлено: %s', row.pk, error)
+                _failed(row, str(error))
+            else:
+                sent.append(row.pk)
+    finally:
+        connection.close()
+        OutboxMessage.objects.filter(pk__in=sent).delete()
+    return len(sent)
+
+
+@tasks.task(queue='high')
+def deliver():
+    """Доставляет готовые письма пачками, пока они не кончатся.
+
+    Если остались письма, ждущие повтора, задача ставит себя снова
+    на время ближайшей попытки.
+    """
+    while True:
+        rows = _claim()
+        if not rows:
+            break
+        send_batch(rows)
+    retry = OutboxMessage.objects.filter(
+        failed__isnull=True
+    ).order_by('next_attempt').values_list('next_attempt', flat=True).first()
+    if retry is not None:
+        delay = max((retry - timezone.now()).total_seconds(), 0)
+        deliver.enqueue(key='outbox:retry', delay=delay)
@@ -0,0 +1,135 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import db
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, comments INTEGER)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'text TEXT)',
+    'INSERT INTO post (id, comments) VALUES (1, 0)',
+)
+
+
+def _connect(path, profile):
+    connection = sqlite3.connect(path, isolation_level=None)
+    if profile:
+        for pragma in db.pragmas():
+            connection.execute(pragma)
+    return connection
+
+
+def _write(connection, profile):
+    """Транзакция как у add_comment: прочитать пост, записать
+    комментарий, обновить счётчик."""
+    connection.execute('BEGIN IMMEDIATE' if profile else 'BEGIN')
+    try:
+        connection.execute('SELECT comments FROM post WHERE id = 1')
+        connection.execute(
+            'INSERT INTO comment (post_id, text) VALUES (1, ?)', ('текст',)
+        )
+        connection.execute(
+            'UPDATE post SET comments = comments + 1 WHERE id = 1'
+        )
+        connection.execute('COMMIT')
+    except sqlite3.OperationalError:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def _writer(path, profile, deadline, results):
+    connection = _connect(path, profile)
+    commits = errors = 0
+    while time.time() < deadline:
+        for attempt in range(5 if profile else 1):
+            try:
+                _write(connection, profile)
+            except sqlite3.OperationalError as error:
+                if not db.is_locked(error):
+                    raise
+                if profile:
+                    time.sleep(db.backoff(attempt))
+                    continue
+                errors += 1
+            else:
+                commits += 1
+            break
+        else:
+            errors += 1
+    results.put(('write', commits, errors))
+
+
+def _reader(path, profile, deadline, results):
+    connection = _connect(path, profile)
+    reads = errors = 0
+    while time.time() < deadline:
+        try:
+            connection.execute(
+                'SELECT count(*) FROM comment WHERE post_id = 1'
+            ).fetchone()
+        except sqlite3.OperationalError:
+            errors += 1
+        else:
+            reads += 1
+    results.put(('read', reads, errors))
+
+
+def run(path, profile, writers, readers, seconds):
+    connection = _connect(path, profile)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.close()
+    results = multiprocessing.Queue()
+    deadline = time.time() + seconds
+    processes = [
+        multiprocessing.Process(
+            target=target, args=(path, profile, deadline, results)
+        )
+        for target, count in ((_writer, writers), (_reader, readers))
+        for _ in range(count)
+    ]
+    for process in processes:
+        process.start()
+    totals = {'write': [0, 0], 'read': [0, 0]}
+    for _ in processes:
+        kind, done, errors = results.get()
+        totals[kind][0] += done
+        totals[kind][1] += errors
+    for process in processes:
+        process.join()
+    return totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность параллельной записи в SQLite '
+        'с настройками по умолчанию и с профилем core.db.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, **options):
+        for title, profile in (('По умолчанию', False), ('core.db', True)):
+            with tempfile.TemporaryDirectory() as directory:
+                totals = run(
+                    os.path.join(directory, 'bench.sqlite3'), profile,
+                    options['writers'], options['readers'],
+                    options['seconds']
+                )
+            (writes, write_errors), (reads, read_errors) = (
+                totals['write'], totals['read']
+            )
+            self.stdout.write(
+                f'{title}: {writes / options["seconds"]:.0f} записей/с, '
+                f'ошибок блокировки {write_errors}; '
+                f'{reads / options["seconds"]:.0f} чтений/с, '
+                f'ошибок {read_errors}'
+            )
@@ -0,0 +1,62 @@
+import multiprocessing
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.tasks import Worker
+
+
+def _work(queues, burst):
+    Worker(queues).run(burst)
+
+
+class Command(BaseCommand):
+    help = 'Запускает воркеры очереди отложенных задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help='Сколько процессов-воркеров запустить.'
+        )
+        parser.add_argument(
+            '--queues',
+            help='Очереди через запятую, от важной к фоновой '
+                 '(по умолчанию TASK_QUEUES).'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выйти, когда готовых задач не останется.'
+        )
+
+    def handle(self, *args, **options):
+        queues = (
+            options['queues'].split(',') if options['queues']
+            else settings.TASK_QUEUES
+        )
+        if options['processes'] <= 1:
+            worker = Worker(queues).run(options['burst'])
+            self.stdout.write(
+                f'Выполнено задач: {worker.done}, упало: {worker.failed}'
+            )
+            return
+        # Соединения с БД не должны переходить в дочерние процессы.
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=_work, args=(queues, options['burst'])
+            )
+            for _ in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+
+        def stop(*args):
+            for process in processes:
+                process.terminate()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import replica
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в локальную реплику.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять копирование каждые N секунд.'
+        )
+        parser.add_argument(
+            '--pages', type=int,
+            help='Страниц за шаг копирования (по умолчанию '
+                 'REPLICA_SYNC_PAGES).'
+        )
+
+    def handle(self, *args, **options):
+        if not replica.enabled():
+            raise CommandError('Реплика не настроена.')
+        while True:
+            started = time.monotonic()
+            replica.sync(options['pages'])
+            self.stdout.write(
+                f'Реплика обновлена за {time.monotonic() - started:.2f} с'
+            )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+from django.conf import settings
+
+from . import replica
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaMiddleware:
+    """Отправляет чтение безопасных запросов на реплику.
+
+    После запроса, который что-то записал, браузер получает cookie
+    REPLICA_STICKY_COOKIE на REPLICA_STICKY_SECONDS: пока она жива, все
+    запросы пользователя читают основную базу и видят его собственные
+    записи, даже если реплика ещё не догнала.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replica.begin(
+            request.method in SAFE_METHODS
+            and settings.REPLICA_STICKY_COOKIE not in request.COOKIES
+        )
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = replica.end()
+        if wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.16 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='Задача')),
+                ('args', models.TextField(default='[]', help_text='Позиционные аргументы в JSON', verbose_name='Аргументы')),
+                ('queue', models.CharField(default='default', max_length=50, verbose_name='Очередь')),
+                ('key', models.CharField(blank=True, help_text='Пока задача с ключом ждёт, такая же не ставится', max_length=255, null=True, unique=True, verbose_name='Ключ')),
+                ('run_at', models.DateTimeField(help_text='Взятая воркером задача скрыта до этого времени', verbose_name='Не раньше')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('max_attempts', models.PositiveIntegerField(verbose_name='Максимум попыток')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='Воркер')),
+                ('error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('failed', models.DateTimeField(blank=True, null=True, verbose_name='Провалена')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Поставлена')),
+            ],
+            options={
+                'verbose_name': 'Задача',
+                'verbose_name_plural': 'Задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['queue', 'failed', 'run_at'], name='core_task_queue_0f0042_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.16 on 2026-10-17 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.TextField(verbose_name='Тема')),
+                ('body', models.TextField(verbose_name='Текст')),
+                ('from_email', models.CharField(max_length=254, verbose_name='Отправитель')),
+                ('payload', models.TextField(help_text='Получатели, заголовки и HTML-версия в JSON', verbose_name='Адресаты и заголовки')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt', models.DateTimeField(db_index=True, verbose_name='Следующая попытка')),
+                ('claimed_by', models.CharField(blank=True, max_length=100, verbose_name='Отправитель пачки')),
+                ('error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('failed', models.DateTimeField(blank=True, null=True, verbose_name='Не доставлено')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+            ],
+            options={
+                'verbose_name': 'Письмо',
+                'verbose_name_plural': 'Исходящие письма',
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-17 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnowflakeNode',
+            fields=[
+                ('node', models.PositiveSmallIntegerField(primary_key=True, serialize=False, verbose_name='Узел')),
+                ('token', models.CharField(max_length=32, verbose_name='Арендатор')),
+                ('expires', models.DateTimeField(verbose_name='Аренда до')),
+            ],
+            options={
+                'verbose_name': 'Узел id',
+                'verbose_name_plural': 'Узлы id',
+            },
+        ),
+    ]
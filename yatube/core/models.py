@@ -11,3 +11,164 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class StoredFile(models.Model):
+    """Файл в хранилище и число записей, которые на него ссылаются."""
+    name = models.CharField(
+        'Имя файла',
+        max_length=255,
+        primary_key=True
+    )
+    refs = models.PositiveIntegerField(
+        'Число ссылок',
+        default=0
+    )
+    released = models.DateTimeField(
+        'Последняя ссылка снята',
+        blank=True,
+        null=True
+    )
+
+    class Meta:
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class Task(models.Model):
+    """Отложенная задача, которую выполнит воркер run_workers."""
+    name = models.CharField(
+        'Задача',
+        max_length=200
+    )
+    args = models.TextField(
+        'Аргументы',
+        default='[]',
+        help_text='Позиционные аргументы в JSON'
+    )
+    queue = models.CharField(
+        'Очередь',
+        max_length=50,
+        default='default'
+    )
+    key = models.CharField(
+        'Ключ',
+        max_length=255,
+        blank=True,
+        null=True,
+        unique=True,
+        help_text='Пока задача с ключом ждёт, такая же не ставится'
+    )
+    run_at = models.DateTimeField(
+        'Не раньше',
+        help_text='Взятая воркером задача скрыта до этого времени'
+    )
+    attempts = models.PositiveIntegerField(
+        'Попыток',
+        default=0
+    )
+    max_attempts = models.PositiveIntegerField(
+        'Максимум попыток'
+    )
+    locked_by = models.CharField(
+        'Воркер',
+        max_length=100,
+        blank=True
+    )
+    error = models.TextField(
+        'Последняя ошибка',
+        blank=True
+    )
+    failed = models.DateTimeField(
+        'Провалена',
+        blank=True,
+        null=True
+    )
+    created = models.DateTimeField(
+        'Поставлена',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        indexes = [models.Index(fields=['queue', 'failed', 'run_at'])]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class OutboxMessage(models.Model):
+    """Письмо, которое ждёт отправки фоновым воркером."""
+    subject = models.TextField(
+        'Тема'
+    )
+    body = models.TextField(
+        'Текст'
+    )
+    from_email = models.CharField(
+        'Отправитель',
+        max_length=254
+    )
+    payload = models.TextField(
+        'Адресаты и заголовки',
+        help_text='Получатели, заголовки и HTML-версия в JSON'
+    )
+    attempts = models.PositiveIntegerField(
+        'Попыток',
+        default=0
+    )
+    next_attempt = models.DateTimeField(
+        'Следующая попытка',
+        db_index=True
+    )
+    claimed_by = models.CharField(
+        'Отправитель пачки',
+        max_length=100,
+        blank=True
+    )
+    error = models.TextField(
+        'Последняя ошибка',
+        blank=True
+    )
+    failed = models.DateTimeField(
+        'Не доставлено',
+        blank=True,
+        null=True
+    )
+    created = models.DateTimeField(
+        'Создано',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Исходящие письма'
+
+    def __str__(self) -> str:
+        return self.subject
+
+
+class SnowflakeNode(models.Model):
+    """Узел snowflake-id, арендованный процессом (core.snowflake)."""
+    node = models.PositiveSmallIntegerField(
+        'Узел',
+        primary_key=True
+    )
+    token = models.CharField(
+        'Арендатор',
+        max_length=32
+    )
+    expires = models.DateTimeField(
+        'Аренда до'
+    )
+
+    class Meta:
+        verbose_name = 'Узел id'
+        verbose_name_plural = 'Узлы id'
+
+    def __str__(self) -> str:
+        return str(self.node)
@@ -0,0 +1,34 @@
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger(__name__)
+
+
+def query_budget(max_queries: int):
+    """Объявляет, сколько SQL-запросов может выполнить view.
+
+    Бюджет хранится в атрибуте query_budget и проверяется в тестах
+    через QueryBudgetMixin. При DEBUG превышение пишется в лог.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not settings.DEBUG:
+                return view(request, *args, **kwargs)
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request, *args, **kwargs)
+            if len(queries) > max_queries:
+                logger.warning(
+                    '%s: %d SQL-запросов при бюджете %d',
+                    request.path, len(queries), max_queries
+                )
+            return response
+
+        wrapper.query_budget = max_queries
+        return wrapper
+
+    return decorator
@@ -0,0 +1,81 @@
+"""Чтение с реплики и копирование основной базы в реплику.
+
+Локально реплика — второй файл SQLite, который sync() заполняет через
+backup API; на проде на её месте настоящая реплика с тем же алиасом.
+Реплика включается настройкой REPLICA_DATABASE, а обновляет её только
+команда sync_replica, в том числе первый раз после migrate.
+"""
+import sqlite3
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+_local = threading.local()
+
+
+def begin(use_replica):
+    _local.use_replica = use_replica
+    _local.wrote = False
+
+
+def end():
+    wrote = getattr(_local, 'wrote', False)
+    _local.use_replica = _local.wrote = False
+    return wrote
+
+
+def _is_copy(alias) -> bool:
+    """Реплика — та же база, например зеркало default в тестах."""
+    return (
+        connections[alias].settings_dict['NAME']
+        == connections['default'].settings_dict['NAME']
+    )
+
+
+def enabled() -> bool:
+    alias = settings.REPLICA_DATABASE
+    return (
+        alias is not None
+        and alias in settings.DATABASES
+        and not _is_copy(alias)
+    )
+
+
+def reading_from_replica() -> bool:
+    """Читать с реплики можно только в безопасном запросе без
+    недавних записей, пока в нём самом ничего не записано и не открыта
+    транзакция на основной базе. Вне запросов (команды, воркеры)
+    всё читается с основной."""
+    return (
+        enabled()
+        and getattr(_local, 'use_replica', False)
+        and not getattr(_local, 'wrote', False)
+        and not connections['default'].in_atomic_block
+    )
+
+
+def mark_write():
+    _local.wrote = True
+
+
+def sync(pages=None):
+    """Копирует основную базу в реплику через backup API.
+
+    Копирование идёт порциями по pages страниц: между порциями основная
+    база свободна для записи, а читатели реплики видят её прежнее
+    состояние до конца копирования.
+    """
+    alias = settings.REPLICA_DATABASE
+    if not enabled():
+        return False
+    source = sqlite3.connect(connections['default'].settings_dict['NAME'])
+    target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+    try:
+        source.backup(
+            target, pages=pages or settings.REPLICA_SYNC_PAGES
+        )
+    finally:
+        target.close()
+        source.close()
+    return True
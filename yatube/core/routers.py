@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from . import replica
+
+
+class ReplicaRouter:
+    """Пишет в основную базу, читает с реплики, когда это безопасно.
+
+    Модели приложений из REPLICA_PRIMARY_APPS всегда читаются из
+    основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (model._meta.app_label not in settings.REPLICA_PRIMARY_APPS
+                and replica.reading_from_replica()):
+            return settings.REPLICA_DATABASE
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        replica.mark_write()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплика получает схему вместе с данными при синхронизации.
+        return db == 'default'
@@ -0,0 +1,220 @@
+"""64-битные id, упорядоченные по времени.
+
+Раскладка id, от старших битов к младшим: 41 бит — миллисекунды от
+SNOWFLAKE_EPOCH, 4 бита — номер шарда, 6 бит — узел (процесс),
+12 бит — счётчик внутри миллисекунды. Старший бит всегда 0, поэтому
+id помещается в знаковый BIGINT и в INTEGER PRIMARY KEY SQLite,
+а сортировка по id совпадает с сортировкой по времени создания.
+
+Узел процесс берёт в аренду в таблице SnowflakeNode основной базы,
+если SNOWFLAKE_NODE не задан явно; после fork дочерний процесс
+арендует свой узел. Кэш для этого не годится: вытеснив ключ аренды,
+он отдал бы тот же узел второму процессу.
+"""
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS, IntegrityError, connections, models, transaction
+)
+from django.utils import timezone
+
+from core.models import SnowflakeNode
+
+TIME_BITS = 41
+SHARD_BITS = 4
+NODE_BITS = 6
+SEQUENCE_BITS = 12
+
+NODE_SHIFT = SEQUENCE_BITS
+SHARD_SHIFT = NODE_SHIFT + NODE_BITS
+TIME_SHIFT = SHARD_SHIFT + SHARD_BITS
+
+_lock = threading.Lock()
+_state = {}
+
+
+def _reset():
+    _state.update(
+        node=None, token=None, leased=0.0, pending=None,
+        last=-1, sequence=0, backfill=0
+    )
+
+
+_reset()
+os.register_at_fork(after_in_child=_reset)
+
+
+def _millis(moment=None) -> int:
+    seconds = time.time() if moment is None else moment.timestamp()
+    return int((seconds - settings.SNOWFLAKE_EPOCH.timestamp()) * 1000)
+
+
+def make(millis, shard=0, node=0, sequence=0) -> int:
+    if not 0 <= millis < 1 << TIME_BITS:
+        raise ValueError(f'Время вне диапазона id: {millis} мс от эпохи.')
+    if not 0 <= shard < 1 << SHARD_BITS:
+        raise ValueError(f'Номер шарда не помещается в id: {shard}.')
+    return (
+        millis << TIME_SHIFT | shard << SHARD_SHIFT
+        | node << NODE_SHIFT | sequence
+    )
+
+
+def shard_of(pk) -> int:
+    return int(pk) >> SHARD_SHIFT & (1 << SHARD_BITS) - 1
+
+
+def min_id(moment) -> int:
+    """Наименьший id, выданный не раньше moment: граница для pk__lt."""
+    return make(max(_millis(moment), 0))
+
+
+def _written() -> bool:
+    """Аренда записана в базу или ещё будет записана.
+
+    Аренда, взятая внутри транзакции, появится в базе только с её
+    коммитом. Откатив транзакцию или точку сохранения, Django выбрасывает
+    и её колбэк on_commit: тогда аренду нужно взять заново.
+    """
+    pending = _state['pending']
+    if pending is None:
+        return True
+    return any(
+        func is pending
+        for sids, func in connections[DEFAULT_DB_ALIAS].run_on_commit
+    )
+
+
+def _take(leases, node, token, now, expires) -> bool:
+    """Занимает свободный или просроченный узел."""
+    if leases.filter(node=node, expires__lte=now).update(
+        token=token, expires=expires
+    ):
+        return True
+    try:
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            leases.create(node=node, token=token, expires=expires)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _lease(lease):
+    now = timezone.now()
+    expires = now + timedelta(seconds=lease)
+    leases = SnowflakeNode.objects.using(DEFAULT_DB_ALIAS)
+    node, token = _state['node'], _state['token']
+    if node is None or not leases.filter(node=node, token=token).update(
+        expires=expires
+    ):
+        token = uuid.uuid4().hex
+        nodes = list(range(1 << NODE_BITS))
+        random.shuffle(nodes)
+        for node in nodes:
+            if _take(leases, node, token, now, expires):
+                break
+        else:
+            raise RuntimeError(
+                'Все узлы snowflake заняты: задайте SNOWFLAKE_NODE '
+                'или уменьшите число процессов.'
+            )
+    _state.update(node=node, token=token, leased=time.monotonic())
+    _state['pending'] = None
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        def written():
+            if _state['pending'] is written:
+                _state['pending'] = None
+
+        _state['pending'] = written
+        transaction.on_commit(written, using=DEFAULT_DB_ALIAS)
+
+
+def _node() -> int:
+    """Узел процесса; аренда продлевается на каждой половине срока."""
+    if settings.SNOWFLAKE_NODE is not None:
+        return settings.SNOWFLAKE_NODE
+    lease = settings.SNOWFLAKE_NODE_LEASE
+    if time.monotonic() - _state['leased'] >= lease / 2 or not _written():
+        _lease(lease)
+    return _state['node']
+
+
+def next_id(shard=0) -> int:
+    """Новый id. За одну миллисекунду узел выдаёт до 4096 id, дальше
+    ждёт следующей; при переводе часов назад продолжает с последней."""
+    with _lock:
+        node = _node()
+        millis = _millis()
+        if millis > _state['last']:
+            _state['sequence'] = 0
+        else:
+            millis = _state['last']
+            _state['sequence'] = _state['sequence'] + 1 & (
+                (1 << SEQUENCE_BITS) - 1
+            )
+            while not _state['sequence'] and _millis() <= millis:
+                time.sleep(0.0001)
+            if not _state['sequence']:
+                millis = _millis()
+        _state['last'] = millis
+        return make(millis, shard, node, _state['sequence'])
+
+
+def for_time(moment, shard=0) -> int:
+    """id для записи с датой из прошлого, например при импорте.
+
+    Счётчик здесь общий на все даты, поэтому уникальность держится
+    первичным ключом: совпадение возможно, только если узел уже выдал
+    id в ту же миллисекунду с тем же счётчиком. Для даты раньше
+    SNOWFLAKE_EPOCH id нет: ValueError.
+    """
+    millis = _millis(moment)
+    if millis < 0:
+        raise ValueError(f'Дата раньше SNOWFLAKE_EPOCH: {moment}.')
+    with _lock:
+        node = _node()
+        _state['backfill'] = _state['backfill'] + 1 & (
+            (1 << SEQUENCE_BITS) - 1
+        )
+        return make(millis, shard, node, _state['backfill'])
+
+
+class SnowflakeField(models.BigIntegerField):
+    """Первичный ключ, который next_id() выдаёт при вставке строки.
+
+    Номер шарда для id модель сообщает методом id_shard(). Поле не
+    редактируется; default=None отмечает, что заполнять его не нужно.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs['default'] = None
+        kwargs['editable'] = False
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['default'], kwargs['editable']
+        return name, path, args, kwargs
+
+    def db_type(self, connection):
+        # В SQLite только INTEGER PRIMARY KEY — псевдоним rowid, на котором
+        # держатся content_rowid индекса поиска и быстрые выборки по id.
+        if connection.vendor == 'sqlite':
+            return 'integer'
+        return super().db_type(connection)
+
+    def pre_save(self, model_instance, add):
+        # id выдаётся здесь, а не в get_pk_value_on_save: с заданным pk
+        # Django перед INSERT пробовал бы UPDATE.
+        value = getattr(model_instance, self.attname)
+        if add and value is None:
+            id_shard = getattr(model_instance, 'id_shard', None)
+            value = next_id(id_shard() if id_shard else 0)
+            setattr(model_instance, self.attname, value)
+        return value
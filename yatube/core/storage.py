@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.deconstruct import deconstructible
+
+from .models import StoredFile
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, которое называет файлы по SHA-256 содержимого.
+
+    Каталог из upload_to сохраняется: posts/ab/<hash>.jpg. Одинаковые
+    загрузки получают одно имя и хранятся один раз, а миниатюры sorl,
+    ключом которых служит имя, создаются для них тоже один раз.
+    Сколько записей ссылается на файл, считает StoredFile.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        name = os.path.join(directory, digest[:2], digest + extension)
+        if self.exists(name):
+            # Сборщик мусора отсчитывает срок от mtime: повторная
+            # загрузка продлевает жизнь файлу, ещё не получившему ссылку.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+
+def retain(name):
+    """Увеличивает счётчик ссылок на файл."""
+    if not name:
+        return
+    updated = StoredFile.objects.filter(name=name).update(
+        refs=F('refs') + 1, released=None
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            StoredFile.objects.create(name=name, refs=1)
+    except IntegrityError:
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Уменьшает счётчик ссылок; файл без ссылок удалит сборщик мусора."""
+    if not name:
+        return
+    StoredFile.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1
+    )
+    StoredFile.objects.filter(name=name, refs=0, released=None).update(
+        released=timezone.now()
+    )
+
+
+def iter_files(storage, directory=''):
+    """Лениво обходит каталог хранилища: (имя, размер, время изменения).
+
+    Работает через os.scandir, поэтому в памяти держится только
+    текущий каталог обхода, а не весь список файлов.
+    """
+    root = storage.path(directory)
+    if not os.path.isdir(root):
+        return
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        with os.scandir(storage.path(current)) as entries:
+            for entry in entries:
+                name = f'{current}/{entry.name}' if current else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    yield name, stat.st_size, stat.st_mtime
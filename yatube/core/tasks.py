@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import time
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_tasks = {}
+
+
+def task(queue='default', max_attempts=None):
+    """Регистрирует функцию как задачу очереди.
+
+    У функции появляется метод enqueue(*args, key=None, delay=0);
+    аргументы должны сериализоваться в JSON.
+    """
+    def register(func):
+        name = f'{func.__module__}.{func.__name__}'
+        _tasks[name] = (func, queue, max_attempts)
+        func.task_name = name
+        func.enqueue = lambda *args, **options: enqueue(
+            name, *args, **options
+        )
+        return func
+    return register
+
+
+def _resolve(name):
+    if name not in _tasks:
+        # Задачи регистрируются при импорте модуля, в котором объявлены.
+        import_module(name.rpartition('.')[0])
+    return _tasks[name]
+
+
+def enqueue(name, *args, key=None, delay=0, queue=None):
+    """Ставит задачу в очередь.
+
+    Строка пишется в текущей транзакции, поэтому воркер увидит задачу
+    только после коммита, а при откате она пропадёт вместе с данными,
+    ради которых её ставили. Задача с ключом key не дублируется, пока
+    такая же ещё ждёт выполнения.
+    """
+    func, default_queue, max_attempts = _resolve(name)
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: func(*args))
+        return
+    Task.objects.bulk_create([Task(
+        name=name,
+        args=json.dumps(args),
+        queue=queue or default_queue,
+        key=key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )], ignore_conflicts=True)
+
+
+def backoff(attempts) -> float:
+    """Пауза перед повтором: экспонента с разбросом, чтобы упавшие
+    вместе задачи не повторялись тоже вместе."""
+    delay = min(
+        settings.TASK_RETRY_DELAY * 2 ** (attempts - 1),
+        settings.TASK_RETRY_MAX_DELAY
+    )
+    return delay * random.uniform(1, 1.5)
+
+
+class Worker:
+    """Воркер очереди задач.
+
+    Очереди перечислены от важной к фоновой: задача из следующей берётся,
+    только когда в предыдущих нет готовых. Взятая задача не удаляется,
+    а прячется: её run_at сдвигается на TASK_VISIBILITY_TIMEOUT. Если
+    воркер упал посреди задачи, после таймаута её возьмёт другой.
+    Задачу захватывает тот, чей UPDATE по старому run_at изменил строку,
+    поэтому несколько процессов не возьмут одну задачу дважды. Задача,
+    которую брали max_attempts раз и ни разу не завершили, помечается
+    упавшей, а не берётся снова.
+    """
+
+    def __init__(self, queues=None, name=None):
+        self.queues = tuple(queues or settings.TASK_QUEUES)
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        self.done = 0
+        self.failed = 0
+
+    def claim(self):
+        now = timezone.now()
+        for queue in self.queues:
+            candidates = Task.objects.filter(
+                queue=queue, failed__isnull=True, run_at__lte=now
+            ).order_by('run_at').values_list(
+                'pk', 'run_at', 'attempts', 'max_attempts'
+            )[:10]
+            for pk, run_at, attempts, max_attempts in candidates:
+                if attempts >= max_attempts:
+                    self.give_up(pk, run_at, now)
+                    continue
+                claimed = Task.objects.filter(pk=pk, run_at=run_at).update(
+                    run_at=now + timedelta(
+                        seconds=settings.TASK_VISIBILITY_TIMEOUT
+                    ),
+                    attempts=F('attempts') + 1,
+                    locked_by=self.name,
+                    # Начатая задача уже не «ждёт»: такую же можно
+                    # поставить снова, например для изменившихся данных.
+                    key=None,
+                )
+                if claimed:
+                    return Task.objects.get(pk=pk)
+        return None
+
+    def give_up(self, pk, run_at, now):
+        """Помечает упавшей задачу, все попытки которой взяли и не
+        завершили: она роняет воркер или не укладывается в
+        TASK_VISIBILITY_TIMEOUT, и брать её снова бесполезно."""
+        if Task.objects.filter(pk=pk, run_at=run_at).update(
+            failed=now,
+            key=None,
+            locked_by='',
+            error='Попытки кончились: воркер не завершил задачу за '
+                  'TASK_VISIBILITY_TIMEOUT.',
+        ):
+            logger.error('Задача %s брошена: попытки кончились', pk)
+
+    def execute(self, job):
+        try:
+            func = _resolve(job.name)[0]
+            func(*json.loads(job.args))
+        except Exception:
+            logger.exception('Задача %s (%s) упала', job.name, job.pk)
+            self.retry(job, traceback.format_exc())
+            return False
+        Task.objects.filter(pk=job.pk).delete()
+        self.done += 1
+        return True
+
+    def retry(self, job, error):
+        self.failed += 1
+        changes = {'error': error, 'locked_by': ''}
+        if job.attempts >= job.max_attempts:
+            # Ключ освобождается, чтобы такую задачу можно было поставить
+            # снова; сама строка остаётся для разбора.
+            changes.update(failed=timezone.now(), key=None)
+        else:
+            changes['run_at'] = timezone.now() + timedelta(
+                seconds=backoff(job.attempts)
+            )
+        Task.objects.filter(pk=job.pk).update(**changes)
+
+    def run_once(self):
+        """Выполняет одну готовую задачу; False, если таких нет."""
+        close_old_connections()
+        job = self.claim()
+        if job is None:
+            return False
+        self.execute(job)
+        return True
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def run(self, burst=False):
+        """Берёт задачи, пока не остановят; burst — пока они есть."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while not self.stopping:
+            if self.run_once():
+                continue
+            if burst:
+                break
+            time.sleep(settings.TASK_POLL_INTERVAL)
+        return self
+
+
+def run_pending(queues=None):
+    """Выполняет все готовые задачи в текущем процессе."""
+    worker = Worker(queues)
+    while worker.run_once():
+        pass
+    return worker
@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+
+def isolated_caches(directory):
+    """CACHES для тестов: тот же SQLiteCache, но в файле из directory."""
+    return {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(directory, 'cache.sqlite3'),
+            'OPTIONS': {
+                'MAX_ENTRIES': 100000,
+            },
+        }
+    }
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с кэшем во временном файле.
+
+    Тесты чистят кэш, а общий файл кэша сервера трогать им нельзя.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp()
+        self.caches = override_settings(
+            CACHES=isolated_caches(self.cache_directory)
+        )
+        self.caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.caches.disable()
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов, объявленного через @query_budget."""
+
+    def assertQueryBudget(self, client, url, data=None):
+        view = resolve(url.split('?')[0]).func
+        budget = getattr(view, 'query_budget', None)
+        self.assertIsNotNone(
+            budget, f'У view для {url} не объявлен @query_budget'
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, data)
+        self.assertLessEqual(
+            len(queries),
+            budget,
+            f'{url}: {len(queries)} запросов при бюджете {budget}:\n'
+            + '\n'.join(query['sql'] for query in queries)
+        )
+        return response
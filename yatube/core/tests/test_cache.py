@@ -0,0 +1,94 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+def _increment(location, times):
+    cache = SQLiteCache(location, {})
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(
+            self.location,
+            {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_CHECK_EVERY': 1}}
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_values_survive_between_instances(self):
+        """Записи одного экземпляра видны другому на том же файле."""
+        self.cache.set_many({'a': {'x': 1}, 'b': 2})
+        other = SQLiteCache(self.location, {})
+        self.assertEqual(other.get_many(['a', 'b', 'c']), {
+            'a': {'x': 1}, 'b': 2
+        })
+        other.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_timeouts(self):
+        """Просроченная запись не читается, add её перезаписывает."""
+        self.cache.set('key', 'value', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr атомарен и различает числа и остальные значения."""
+        self.cache.set('number', 1)
+        self.assertEqual(self.cache.incr('number', 5), 6)
+        self.cache.set('flag', True)
+        self.assertIs(self.cache.get('flag'), True)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_across_processes(self):
+        """Счётчик не теряет приращений из разных процессов."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=_increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_lru_cull(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        self.cache._touch_interval = 0
+        for i in range(10):
+            self.cache.set(f'key-{i}', i)
+        time.sleep(0.01)
+        self.cache.get('key-0')
+        self.cache.set('key-10', 10)
+        self.assertEqual(self.cache.get('key-0'), 0)
+        self.assertIsNone(self.cache.get('key-1'))
+
+
+class TestRunnerCacheTest(SimpleTestCase):
+    def test_tests_use_own_sqlite_cache(self):
+        """Тесты, в том числе тесты view, идут на SQLiteCache, но не
+        на файле кэша сервера."""
+        cache = caches['default']
+        self.assertIsInstance(cache, SQLiteCache)
+        self.assertNotEqual(
+            cache._path,
+            os.path.join(settings.BASE_DIR, 'cache', 'cache.sqlite3')
+        )
@@ -0,0 +1,41 @@
+from unittest import mock
+
+from django.db import OperationalError, connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.db import retry_locked
+
+
+class SQLiteProfileTest(TransactionTestCase):
+    def test_pragmas_are_applied(self):
+        """Каждое соединение получает прагмы профиля."""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_transaction_begins_immediate(self):
+        """Транзакция сразу берёт блокировку на запись."""
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                connection.cursor().execute('SELECT 1')
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+    @override_settings(SQLITE_RETRY_DELAY=0)
+    def test_locked_write_is_retried(self):
+        """Запись, не дождавшаяся блокировки, повторяется."""
+        view = mock.Mock(side_effect=[
+            OperationalError('database is locked'), 'ok'
+        ])
+        self.assertEqual(retry_locked(view)(), 'ok')
+        self.assertEqual(view.call_count, 2)
+
+    @override_settings(SQLITE_RETRY_DELAY=0)
+    def test_other_errors_are_not_retried(self):
+        """Прочие ошибки БД пробрасываются сразу."""
+        view = mock.Mock(side_effect=OperationalError('no such table'))
+        with self.assertRaises(OperationalError):
+            retry_locked(view)()
+        self.assertEqual(view.call_count, 1)
@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core.kvstore import KVStore
+
+
+class KVStoreTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.kvstore = KVStore()
+
+    def test_writes_go_through_memory(self):
+        """Записанное значение читается без кэша и БД."""
+        self.kvstore._set_raw('sorl-thumbnail||image||a', '{"name": "a"}')
+        with self.assertNumQueries(0):
+            cache.clear()
+            self.assertEqual(
+                self.kvstore._get_raw('sorl-thumbnail||image||a'),
+                '{"name": "a"}'
+            )
+
+    @override_settings(THUMBNAIL_MEMORY_TIMEOUT=0)
+    def test_memory_expires(self):
+        """После таймаута значение снова читается из хранилища."""
+        self.kvstore._set_raw('sorl-thumbnail||image||a', '{"name": "a"}')
+        KVStoreModel.objects.all().delete()
+        cache.clear()
+        self.assertIsNone(self.kvstore._get_raw('sorl-thumbnail||image||a'))
+
+    def test_get_many_reads_store_once(self):
+        """get_many добирает все промахи кэша одним запросом."""
+        keys = [f'sorl-thumbnail||image||{i}' for i in range(5)]
+        for key in keys[:3]:
+            KVStoreModel.objects.create(key=key, value=key)
+        with self.assertNumQueries(1):
+            found = self.kvstore.get_many_raw(keys)
+        self.assertEqual(found, {key: key for key in keys[:3]})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.kvstore.get_many_raw(keys), found)
@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import OutboxMessage, Task
+from core.tasks import run_pending
+
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND='core.mail.OutboxBackend',
+    OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_RATE=1000,
+)
+class OutboxTest(TestCase):
+    def test_password_reset_goes_through_outbox(self):
+        """Форма сброса пароля только пишет письмо в таблицу."""
+        User.objects.create_user(
+            username='leo', email='leo@example.com', password='secret'
+        )
+        response = self.client.post(
+            reverse('users:password_reset'), {'email': 'leo@example.com'}
+        )
+        self.assertRedirects(response, reverse('users:password_reset_done'))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['leo@example.com'])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_batch_uses_one_connection(self):
+        """Пачка писем отправляется через одно соединение."""
+        for index in range(3):
+            mail.send_mail('Тема', 'Текст', None, [f'{index}@example.com'])
+        with mock.patch.object(
+            EmailBackend, 'open', autospec=True, return_value=True
+        ) as open_connection:
+            run_pending()
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failed_message_is_retried(self):
+        """Неотправленное письмо откладывается и уходит при повторе."""
+        mail.send_mail('Тема', 'Текст', None, ['leo@example.com'])
+        with mock.patch.object(
+            EmailBackend, 'send_messages', side_effect=OSError('timeout')
+        ):
+            run_pending()
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.error, 'timeout')
+        self.assertGreater(message.next_attempt, timezone.now())
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        Task.objects.update(run_at=timezone.now())
+        run_pending()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(OutboxMessage.objects.exists())
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.contrib.sessions.models import Session
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+
+from core import replica
+from core.middleware import ReplicaMiddleware
+from core.routers import ReplicaRouter
+from posts.models import Post
+
+COOKIE = settings.REPLICA_STICKY_COOKIE
+
+
+@override_settings(REPLICA_DATABASE='replica')
+@mock.patch.object(replica, 'enabled', return_value=True)
+class ReplicaRoutingTest(TransactionTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False, model=Post):
+        """Возвращает базу чтения, выбранную внутри запроса, и ответ."""
+        used = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Post)
+            used.append(self.router.db_for_read(model))
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(request)
+        return used[0], response
+
+    def test_get_reads_replica(self, enabled):
+        """Безопасный запрос читает реплику."""
+        database, response = self.route(self.factory.get('/'))
+        self.assertEqual(database, 'replica')
+        self.assertNotIn(COOKIE, response.cookies)
+
+    def test_sessions_read_primary(self, enabled):
+        """Сессии читаются из основной базы даже в безопасном запросе."""
+        database, response = self.route(
+            self.factory.get('/'), model=Session
+        )
+        self.assertEqual(database, 'default')
+
+    def test_write_pins_user_to_primary(self, enabled):
+        """После записи запросы пользователя читают основную базу."""
+        database, response = self.route(self.factory.get('/'), write=True)
+        self.assertEqual(database, 'default')
+        self.assertEqual(
+            response.cookies[COOKIE]['max-age'],
+            settings.REPLICA_STICKY_SECONDS
+        )
+        request = self.factory.get('/')
+        request.COOKIES[COOKIE] = '1'
+        self.assertEqual(self.route(request)[0], 'default')
+
+    def test_post_reads_primary(self, enabled):
+        """Небезопасные запросы читают основную базу."""
+        self.assertEqual(self.route(self.factory.post('/'))[0], 'default')
+
+    def test_outside_requests_read_primary(self, enabled):
+        """Команды и воркеры читают основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_transaction_reads_primary(self, enabled):
+        """Внутри транзакции на основной базе чтение идёт туда же."""
+        def view(request):
+            with transaction.atomic():
+                return HttpResponse(self.router.db_for_read(Post))
+
+        response = ReplicaMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(response.content, b'default')
+
+
+class ReplicaSyncTest(TestCase):
+    def test_disabled_by_default(self):
+        """Без REPLICA_DATABASE всё читается из основной базы."""
+        self.assertFalse(replica.enabled())
+
+    @override_settings(REPLICA_DATABASE='replica')
+    def test_sync_copies_primary(self):
+        """sync копирует основную базу в файл реплики."""
+        with tempfile.TemporaryDirectory() as directory:
+            primary = os.path.join(directory, 'primary.sqlite3')
+            target = os.path.join(directory, 'replica.sqlite3')
+            with sqlite3.connect(primary) as db:
+                db.execute('CREATE TABLE post (text TEXT)')
+                db.execute("INSERT INTO post VALUES ('Пост')")
+            with mock.patch.dict(
+                connections['default'].settings_dict, NAME=primary
+            ), mock.patch.dict(
+                connections['replica'].settings_dict,
+                NAME=target
+            ):
+                self.assertTrue(replica.sync())
+            with sqlite3.connect(target) as db:
+                self.assertEqual(
+                    db.execute('SELECT text FROM post').fetchall(),
+                    [('Пост',)]
+                )
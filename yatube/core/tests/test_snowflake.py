@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from core import snowflake
+from core.models import SnowflakeNode
+
+
+class SnowflakeTest(TestCase):
+    def setUp(self):
+        snowflake._reset()
+
+    def test_ids_grow_and_carry_shard(self):
+        """id растут в порядке выдачи и хранят номер шарда."""
+        ids = [snowflake.next_id(shard=3) for _ in range(5000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual({snowflake.shard_of(pk) for pk in ids}, {3})
+        self.assertLess(ids[-1], 1 << 63)
+
+    def test_clock_going_back_keeps_order(self):
+        """При переводе часов назад id продолжают расти."""
+        now = 1700000000.0
+        with mock.patch('time.time', return_value=now):
+            first = snowflake.next_id()
+        with mock.patch('time.time', return_value=now - 5):
+            second = snowflake.next_id()
+        self.assertGreater(second, first)
+
+    def test_processes_lease_different_nodes(self):
+        """Процесс после fork арендует свой узел."""
+        node = snowflake._node()
+        snowflake._reset()
+        self.assertNotEqual(snowflake._node(), node)
+        with override_settings(SNOWFLAKE_NODE=7):
+            self.assertEqual(snowflake._node(), 7)
+
+    def test_lease_survives_cache_eviction(self):
+        """Аренда хранится в базе: вытеснение кэша не освобождает узел."""
+        node = snowflake._node()
+        cache.clear()
+        snowflake._reset()
+        self.assertNotEqual(snowflake._node(), node)
+        self.assertEqual(SnowflakeNode.objects.count(), 2)
+
+    def test_rolled_back_lease_is_taken_again(self):
+        """Аренду, откаченную вместе с транзакцией, процесс берёт заново."""
+        with self.assertRaises(ZeroDivisionError):
+            with transaction.atomic():
+                node = snowflake._node()
+                1 / 0
+        self.assertFalse(SnowflakeNode.objects.exists())
+        node = snowflake._node()
+        self.assertTrue(SnowflakeNode.objects.filter(
+            node=node, token=snowflake._state['token']
+        ).exists())
+
+    def test_past_dates_sort_before_new_ids(self):
+        """id для даты из прошлого меньше новых и границы min_id."""
+        moment = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        old = snowflake.for_time(moment)
+        self.assertLess(old, snowflake.min_id(moment + timedelta(seconds=1)))
+        self.assertGreaterEqual(old, snowflake.min_id(moment))
+        self.assertLess(old, snowflake.next_id())
+
+    def test_dates_before_epoch_have_no_id(self):
+        """Для даты раньше SNOWFLAKE_EPOCH id не выдаётся."""
+        with self.assertRaises(ValueError):
+            snowflake.for_time(datetime(2005, 1, 1, tzinfo=timezone.utc))
@@ -0,0 +1,32 @@
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_names_follow_content(self):
+        """Имя строится из хэша содержимого внутри каталога upload_to."""
+        name = self.storage.save('posts/Cat.JPG', ContentFile(b'cat'))
+        self.assertRegex(name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(self.storage.open(name).read(), b'cat')
+
+    def test_identical_uploads_are_stored_once(self):
+        """Одинаковое содержимое сохраняется один раз под одним именем."""
+        first = self.storage.save('posts/a.jpg', ContentFile(b'meme'))
+        second = self.storage.save('posts/b.jpg', ContentFile(b'meme'))
+        other = self.storage.save('posts/c.jpg', ContentFile(b'other'))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        directory = first.rsplit('/', 1)[0]
+        self.assertEqual(len(self.storage.listdir(directory)[1]), 1)
@@ -0,0 +1,109 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.models import Task
+
+calls = []
+
+
+@tasks.task(queue='low')
+def remember(value):
+    calls.append(value)
+
+
+@tasks.task(queue='high', max_attempts=2)
+def explode():
+    raise ValueError('сломалось')
+
+
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        """Задача выполняется воркером и удаляется из очереди."""
+        remember.enqueue('a')
+        task = Task.objects.get()
+        self.assertEqual(task.queue, 'low')
+        worker = tasks.run_pending()
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(worker.done, 1)
+        self.assertFalse(Task.objects.exists())
+
+    def test_rollback_drops_task(self):
+        """Задача из откаченной транзакции не выполняется."""
+        try:
+            with transaction.atomic():
+                remember.enqueue('a')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Task.objects.exists())
+
+    def test_key_deduplicates(self):
+        """Задача с тем же ключом не ставится, пока первая ждёт."""
+        remember.enqueue('a', key='same')
+        remember.enqueue('b', key='same')
+        tasks.run_pending()
+        self.assertEqual(calls, ['a'])
+
+    def test_lanes_run_in_priority_order(self):
+        """Из фоновой очереди задача берётся после важных."""
+        remember.enqueue('low')
+        remember.enqueue('high', queue='high')
+        tasks.run_pending()
+        self.assertEqual(calls, ['high', 'low'])
+
+    def test_failure_is_retried_with_backoff(self):
+        """Упавшая задача откладывается, а после всех попыток помечается."""
+        explode.enqueue()
+        worker = tasks.run_pending()
+        self.assertEqual(worker.failed, 1)
+        task = Task.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('ValueError', task.error)
+        Task.objects.update(run_at=timezone.now())
+        tasks.run_pending()
+        task.refresh_from_db()
+        self.assertIsNotNone(task.failed)
+        self.assertEqual(tasks.run_pending().failed, 0)
+
+    def test_crashed_worker_task_becomes_visible(self):
+        """Задача упавшего воркера снова доступна после таймаута."""
+        remember.enqueue('a')
+        worker = tasks.Worker()
+        self.assertIsNotNone(worker.claim())
+        self.assertIsNone(worker.claim())
+        Task.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        job = tasks.Worker().claim()
+        self.assertEqual(job.attempts, 2)
+
+    def test_task_that_kills_workers_gives_up(self):
+        """Задача, которую взяли max_attempts раз, не берётся снова."""
+        explode.enqueue()
+        for _ in range(2):
+            self.assertIsNotNone(tasks.Worker().claim())
+            Task.objects.update(
+                run_at=timezone.now() - timedelta(seconds=1)
+            )
+        self.assertIsNone(tasks.Worker().claim())
+        task = Task.objects.get()
+        self.assertIsNotNone(task.failed)
+        self.assertEqual(task.attempts, 2)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_on_commit(self):
+        """В режиме TASKS_EAGER задача выполняется сразу после коммита."""
+        with mock.patch.object(
+            transaction, 'on_commit', side_effect=lambda func: func()
+        ) as on_commit:
+            remember.enqueue('a')
+        on_commit.assert_called_once()
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
@@ -0,0 +1,28 @@
+from functools import lru_cache
+
+from PIL import Image
+from sorl.thumbnail import base
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.helpers import serialize, tokey
+
+
+@lru_cache(maxsize=None)
+def can_save(image_format) -> bool:
+    """Умеет ли установленный Pillow сохранять в этот формат."""
+    Image.init()
+    return image_format in Image.SAVE
+
+
+class ThumbnailBackend(base.ThumbnailBackend):
+    """Бэкенд sorl, который знает расширения форматов вне его списка.
+
+    Имена миниатюр для JPEG, PNG, GIF и WEBP совпадают с базовыми,
+    поэтому уже созданные файлы остаются на месте.
+    """
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = '%s/%s/%s' % (key[:2], key[2:4], key)
+        image_format = options['format']
+        extension = base.EXTENSIONS.get(image_format, image_format.lower())
+        return f'{settings.THUMBNAIL_PREFIX}{path}.{extension}'
@@ -1,5 +1,7 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
+from . import search
 from .models import Group, Post, Comment, Follow
 
 
@@ -16,6 +18,16 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        match = search.match_expression(search_term)
+        if not match or not search.is_supported():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.filter(
+            pk__in=RawSQL(search.matching_ids_sql(), [match])
+        ), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
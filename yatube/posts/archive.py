@@ -0,0 +1,177 @@
+"""Архив старых постов.
+
+Команда archive_posts пачками переносит посты старше ARCHIVE_AFTER_DAYS
+вместе с комментариями и записями лент в базу ARCHIVE_DATABASE с той
+же схемой. Горячие таблицы и их индексы остаются маленькими, а чтение
+идёт сквозь архив: пост, которого нет на шарде, ищется в архиве, ленты
+дочитываются из него, когда горячие посты на странице кончились.
+
+Все id в архиве не больше watermark(): по нему видно, когда в архив
+можно не ходить. Архивные посты только читаются.
+"""
+from datetime import timedelta
+
+from core import snowflake
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Max
+from django.http import Http404
+from django.utils import timezone
+
+from .models import Comment, Post, TimelineEntry
+
+WATERMARK_KEY = 'posts:archive:watermark'
+
+
+def enabled() -> bool:
+    return settings.ARCHIVE_DATABASE is not None
+
+
+def is_archive(alias) -> bool:
+    return enabled() and alias == settings.ARCHIVE_DATABASE
+
+
+def holds(instance) -> bool:
+    """Объект прочитан из архива."""
+    return instance is not None and is_archive(instance._state.db)
+
+
+def watermark() -> int:
+    """Наибольший id поста в архиве; 0, если архив пуст или выключен."""
+    if not enabled():
+        return 0
+    top = cache.get(WATERMARK_KEY)
+    if top is None:
+        top = Post.objects.using(settings.ARCHIVE_DATABASE).aggregate(
+            top=Max('pk')
+        )['top'] or 0
+        cache.set(WATERMARK_KEY, top, settings.ARCHIVE_WATERMARK_TIMEOUT)
+    return top
+
+
+def _lookups(tree, prefix=''):
+    for name, children in tree.items():
+        if children:
+            yield from _lookups(children, f'{prefix}{name}__')
+        else:
+            yield f'{prefix}{name}'
+
+
+def archived(queryset):
+    """Копия запроса к архиву.
+
+    Пользователи и группы в архиве не хранятся, поэтому select_related
+    заменяется на prefetch_related из default.
+    """
+    queryset = queryset.using(settings.ARCHIVE_DATABASE)
+    if isinstance(queryset.query.select_related, dict):
+        queryset = queryset.select_related(None).prefetch_related(
+            *_lookups(queryset.query.select_related)
+        )
+    return queryset
+
+
+def get_post_or_404(queryset, pk):
+    """Пост из горячего запроса, а если его там нет — из архива."""
+    post = queryset.filter(pk=pk).first()
+    if post is None and enabled() and int(pk) <= watermark():
+        post = archived(queryset).filter(pk=pk).first()
+    if post is None:
+        raise Http404('Пост не найден.')
+    return post
+
+
+def _copy(rows, copied):
+    """Копирует в архив строки, которых ещё нет в copied, и отмечает их.
+
+    copied хранит id строк в горячей базе: удаляются потом только они.
+    """
+    from .importer import keep_timestamps
+
+    with keep_timestamps(Post, Comment):
+        with transaction.atomic(using=settings.ARCHIVE_DATABASE):
+            for model, queryset in rows:
+                if copied[model]:
+                    # Повторный проход: берутся только новые строки.
+                    queryset = queryset.filter(pk__in=set(
+                        queryset.values_list('pk', flat=True)
+                    ) - copied[model])
+                objects = list(queryset.all())
+                copied[model].update(obj.pk for obj in objects)
+                if model is TimelineEntry:
+                    # id записей лент на разных шардах совпадают; повтор
+                    # отсекает уникальность (user, post).
+                    for entry in objects:
+                        entry.pk = None
+                model.objects.using(
+                    settings.ARCHIVE_DATABASE
+                ).bulk_create(objects, ignore_conflicts=True)
+
+
+def move_batch(alias, cutoff, batch_size) -> int:
+    """Переносит в архив пачку постов базы alias, созданных до cutoff.
+
+    Сначала строки коммитятся в архиве, потом удаляются из горячей
+    базы. Комментарии и записи лент, появившиеся после копирования,
+    докопируются уже под блокировкой записи горячей базы, а удаляются
+    только скопированные строки: ничего не пропадает молча. Если перенос
+    оборвётся посередине, повторный запуск скопирует пачку ещё раз
+    (дубликаты пропускаются) и доудалит её. Удаление идёт в обход
+    сигналов: счётчики и ссылки на картинки не меняются.
+
+    Триггер поиска на удалении убирает посты из индекса горячей базы,
+    а вставка в архив добавляет их в индекс архива: поиск
+    (posts.search) читает и его.
+    """
+    # Диапазон по id идёт по первичному ключу; дата отсекает посты,
+    # созданные до snowflake-id, у которых id меньше любой границы.
+    ids = list(
+        Post.objects.using(alias).filter(
+            pk__lt=snowflake.min_id(cutoff), pub_date__lt=cutoff
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return 0
+    rows = (
+        (Post, Post.objects.using(alias).filter(pk__in=ids)),
+        (Comment, Comment.objects.using(alias).filter(post__in=ids)),
+        (TimelineEntry,
+         TimelineEntry.objects.using(alias).filter(post__in=ids)),
+    )
+    copied = {model: set() for model, _ in rows}
+    _copy(rows, copied)
+    with transaction.atomic(using=alias):
+        _copy(rows, copied)
+        for model, _ in reversed(rows):
+            pks = sorted(copied[model])
+            size = connections[alias].ops.bulk_batch_size(['pk'], pks)
+            for start in range(0, len(pks), size):
+                model.objects.using(alias).filter(
+                    pk__in=pks[start:start + size]
+                )._raw_delete(alias)
+    cache.set(
+        WATERMARK_KEY,
+        max(watermark(), ids[-1]),
+        settings.ARCHIVE_WATERMARK_TIMEOUT
+    )
+    return len(ids)
+
+
+def archive_old(days=None, batch_size=None) -> int:
+    """Переносит в архив посты всех шардов старше days дней.
+
+    Возвращает число перенесённых постов.
+    """
+    cutoff = timezone.now() - timedelta(
+        days=settings.ARCHIVE_AFTER_DAYS if days is None else days
+    )
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    moved = 0
+    for alias in settings.POST_SHARDS:
+        while True:
+            count = move_batch(alias, cutoff, batch_size)
+            moved += count
+            if count < batch_size:
+                break
+    return moved
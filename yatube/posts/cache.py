@@ -0,0 +1,101 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+
+def generation_key(*listing) -> str:
+    return ':'.join(['posts', 'gen', *map(str, listing)])
+
+
+def _new_generation() -> int:
+    # Начинаем с метки времени, а не с единицы: если счётчик вытеснят
+    # из кэша, новые ключи не совпадут со старыми фрагментами.
+    return time.time_ns() // 1000
+
+
+def get_generations(*listings):
+    keys = [generation_key(*listing) for listing in listings]
+    found = cache.get_many(keys)
+    missing = {key: _new_generation() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump_generation(*listings):
+    """Сбрасывает все фрагменты, построенные на этих списках."""
+    for listing in listings:
+        key = generation_key(*listing)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_generation(), None)
+
+
+def fragment_context(*listings):
+    """Контекст для {% cache %}: версия фрагмента и время жизни."""
+    return {
+        'cache_version': '.'.join(map(str, get_generations(*listings))),
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    }
+
+
+def stamp_key(*obj) -> str:
+    return ':'.join(['posts', 'stamp', *map(str, obj)])
+
+
+def touch_stamps(*objects):
+    """Отмечает время последнего изменения поста, автора или группы."""
+    now = time.time()
+    cache.set_many(
+        {stamp_key(*obj): now for obj in objects if obj[-1] is not None},
+        None
+    )
+
+
+def last_changed(*objects):
+    """Время последнего изменения объектов страницы.
+
+    Если штампа нет в кэше, он заводится текущим временем: клиент один
+    раз получит страницу целиком, а дальше будет получать 304.
+    """
+    keys = [stamp_key(*obj) for obj in objects]
+    found = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return datetime.fromtimestamp(max(found.values()), tz=timezone.utc)
+
+
+def conditional_page(objects):
+    """Отвечает 304 Not Modified, пока объекты страницы не менялись.
+
+    objects(**kwargs) возвращает штампы страницы или None, если
+    объекта нет: тогда view отработает как обычно и вернёт 404.
+    ETag учитывает зрителя и параметры запроса, так как от них
+    зависит разметка.
+    """
+    def modified(request, *args, **kwargs):
+        if not hasattr(request, '_posts_last_changed'):
+            page_objects = objects(**kwargs)
+            request._posts_last_changed = (
+                last_changed(*page_objects) if page_objects else None
+            )
+        return request._posts_last_changed
+
+    def etag(request, *args, **kwargs):
+        stamp = modified(request, *args, **kwargs)
+        if stamp is None:
+            return None
+        return hashlib.md5(
+            f'{stamp.timestamp()}:{request.user.pk}:'
+            f'{request.GET.urlencode()}'.encode()
+        ).hexdigest()
+
+    return condition(etag_func=etag, last_modified_func=modified)
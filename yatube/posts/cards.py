@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import thumbnails
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_key(post) -> str:
+    return f'posts:card:{post.pk}:{post.edited.timestamp():.6f}'
+
+
+def render_card(post) -> str:
+    return render_to_string(CARD_TEMPLATE, {'post': post})
+
+
+def attach_cards(posts):
+    """Подставляет постам страницы готовые карточки из кэша.
+
+    Все карточки читаются одним get_many, для недостающих одним
+    заходом находятся миниатюры, затем они рендерятся и записываются
+    одним set_many.
+    """
+    posts = list(posts)
+    keys = {card_key(post): post for post in posts}
+    found = cache.get_many(keys)
+    thumbnails.resolve_thumbnails(
+        [post for key, post in keys.items() if key not in found]
+    )
+    missing = {}
+    for key, post in keys.items():
+        if key not in found:
+            found[key] = missing[key] = render_card(post)
+        post.card_html = found[key]
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return posts
+
+
+def refresh_card(post):
+    post.card_html = render_card(post)
+    cache.set(
+        card_key(post), post.card_html, settings.POST_CARD_CACHE_TIMEOUT
+    )
@@ -0,0 +1,130 @@
+from collections import Counter
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import shards, timeline
+from .models import Comment, Follow, Post, User, UserCounter
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def _actual_user_counts():
+    return {
+        'actual_followers': _count(Follow.objects.all(), 'author'),
+        'actual_following': _count(Follow.objects.all(), 'user'),
+    }
+
+
+def _post_counts():
+    """Число постов по авторам на всех шардах и в архиве.
+
+    Посты лежат не только в default, поэтому считаются отдельным
+    GROUP BY в каждой базе, а не подзапросом к таблице пользователей.
+    """
+    totals = Counter()
+    for posts in shards.each(Post.objects.order_by(), archived=True):
+        totals.update(dict(
+            posts.values_list('author').annotate(total=Count('pk'))
+        ))
+    return totals
+
+
+def bump_user(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя: bump_user(1, posts_count=1).
+
+    Счётчик не уходит ниже нуля; расхождения исправляет
+    reconcile_counters.
+    """
+    UserCounter.objects.filter(
+        user_id=user_id,
+        **{
+            f'{field}__gte': -delta
+            for field, delta in deltas.items() if delta < 0
+        }
+    ).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+def bump_comments(post_id, delta):
+    posts = shards.objects(Post, pk=post_id).filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def create_missing(users=None, batch_size=500):
+    """Заводит счётчики пользователям, у которых их ещё нет."""
+    if users is None:
+        users = User.objects.all()
+    rows = users.filter(counters__isnull=True).annotate(
+        **_actual_user_counts()
+    ).values_list('pk', 'actual_followers', 'actual_following')
+    posts = _post_counts()
+    return len(UserCounter.objects.bulk_create(
+        [
+            UserCounter(
+                user_id=pk,
+                posts_count=posts[pk],
+                followers_count=followers,
+                following_count=following
+            )
+            for pk, followers, following in rows
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True
+    ))
+
+
+def reconcile_users():
+    posts = _post_counts()
+    rows = User.objects.filter(
+        counters__isnull=False
+    ).annotate(**_actual_user_counts()).values_list(
+        'pk', 'counters__posts_count', 'counters__followers_count',
+        'counters__following_count', 'actual_followers', 'actual_following'
+    )
+    drifted = [
+        (pk, posts[pk], followers, following)
+        for pk, *stored, followers, following in rows.iterator()
+        if stored != [posts[pk], followers, following]
+    ]
+    for pk, posts_count, followers, following in drifted:
+        UserCounter.objects.filter(user_id=pk).update(
+            posts_count=posts_count,
+            followers_count=followers,
+            following_count=following
+        )
+        timeline.sync_pull(pk)
+    return len(drifted)
+
+
+def reconcile_posts():
+    drifted = []
+    # Комментарии лежат на шарде поста, так что сверка идёт по шардам.
+    # Архив не сверяется: его посты не меняются.
+    for posts in shards.each(Post.objects.all()):
+        drifted.extend(
+            posts.annotate(
+                actual=_count(Comment.objects.using(posts.db), 'post')
+            ).exclude(
+                comments_count=F('actual')
+            ).values_list('pk', 'actual')
+        )
+    for pk, total in drifted:
+        shards.objects(Post, pk=pk).filter(pk=pk).update(
+            comments_count=total
+        )
+    return len(drifted)
@@ -0,0 +1,125 @@
+import csv
+import heapq
+import json
+import zlib
+from itertools import islice
+
+from django.conf import settings
+
+from . import archive, shards
+from .models import Group, Post, User
+
+FIELDS = ('id', 'author', 'group', 'text', 'pub_date', 'edited', 'image')
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _sources(author, group):
+    """Запросы постов каждого шарда, на которых лежат нужные посты,
+    и архива."""
+    posts = Post.objects.all()
+    if author is not None:
+        posts = posts.filter(author=author)
+        querysets = [
+            shards.objects(Post, author_id=author.pk).filter(author=author)
+        ]
+    else:
+        querysets = shards.each(posts)
+    if archive.enabled():
+        querysets.append(archive.archived(posts))
+    if group is not None:
+        querysets = [posts.filter(group=group) for posts in querysets]
+    return [
+        posts.order_by('pk').values_list(
+            'pk', 'author_id', 'group_id', 'text', 'pub_date', 'edited',
+            'image'
+        ).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        for posts in querysets
+    ]
+
+
+def export_posts(author=None, group=None):
+    """Посты автора, группы или всего сайта в виде словарей для выгрузки.
+
+    Строки читаются QuerySet.iterator() порциями по EXPORT_CHUNK_SIZE
+    с каждого шарда и из архива и сливаются по id, поэтому в памяти
+    одновременно держится по одной порции на базу. Пользователи и группы лежат
+    в default, их имена достаются одним запросом на порцию.
+    """
+    rows = heapq.merge(*_sources(author, group))
+    while True:
+        chunk = list(islice(rows, settings.EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        usernames = dict(User.objects.filter(
+            pk__in={row[1] for row in chunk}
+        ).values_list('pk', 'username'))
+        slugs = dict(Group.objects.filter(
+            pk__in={row[2] for row in chunk}
+        ).values_list('pk', 'slug'))
+        for pk, author_id, group_id, text, pub_date, edited, image in chunk:
+            yield {
+                'id': pk,
+                'author': usernames.get(author_id),
+                'group': slugs.get(group_id),
+                'text': text,
+                'pub_date': pub_date.isoformat(),
+                'edited': edited.isoformat(),
+                'image': image or None,
+            }
+
+
+def ndjson_lines(records):
+    """Формат, который понимает import_content: тип записи в поле type."""
+    for record in records:
+        yield json.dumps({'type': 'post', **record}, ensure_ascii=False) + '\n'
+
+
+class _Line:
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.writer(_Line())
+    yield writer.writerow(FIELDS)
+    for record in records:
+        yield writer.writerow(
+            '' if record[field] is None else record[field]
+            for field in FIELDS
+        )
+
+
+def encode(lines, compress=False):
+    """Кодирует строки в байты, при compress=True сжимая gzip на лету.
+
+    Каждые EXPORT_CHUNK_SIZE строк сжатый поток сбрасывается
+    (Z_SYNC_FLUSH), чтобы клиент получал данные сразу, а не в конце.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) < settings.EXPORT_CHUNK_SIZE:
+            continue
+        data = ''.join(buffer).encode()
+        buffer = []
+        if compress:
+            data = compressor.compress(data) + compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+        yield data
+    data = ''.join(buffer).encode()
+    if compress:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+def stream(records, file_format='ndjson', compress=False):
+    lines = csv_lines(records) if file_format == 'csv' else ndjson_lines(
+        records
+    )
+    return encode(lines, compress)
@@ -1,8 +1,24 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from .images import check, ingest
 from .models import Comment, Post
 
 
+def _checked_image(to_python):
+    """Оборачивает ImageField.to_python проверкой лимитов по заголовку.
+
+    to_python открывает загрузку в Pillow и вызывает verify(), поэтому
+    check() должен сработать раньше: тогда слишком большой файл
+    отклоняется, не будучи прочитанным целиком.
+    """
+    def wrapper(data):
+        if isinstance(data, UploadedFile):
+            check(data)
+        return to_python(data)
+    return wrapper
+
+
 class PostForm(forms.ModelForm):
 
     class Meta:
@@ -14,6 +30,27 @@ class PostForm(forms.ModelForm):
             'image': 'Фотография к посту'
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        image = self.fields['image']
+        image.to_python = _checked_image(image.to_python)
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return ingest(image)
+        return image
+
+    def store_image(self):
+        """Записывает новую картинку в хранилище до сохранения поста.
+
+        Хэширование и запись файла идут вне транзакции и не держат
+        блокировку базы; при сохранении поста файл уже записан.
+        """
+        image = self.cleaned_data.get('image')
+        if 'image' in self.changed_data and image:
+            self.instance.image.save(image.name, image, save=False)
+
 
 class CommentForm(forms.ModelForm):
 
@@ -0,0 +1,91 @@
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+
+
+def check(upload):
+    """Проверяет байты, формат и число пикселей загруженной картинки.
+
+    Читается только заголовок файла, пиксели не декодируются, поэтому
+    проверку можно (и нужно) делать до ImageField.to_python, который
+    прогоняет через Pillow verify() весь файл.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)s',
+            code='file_too_large',
+            params={'limit': filesizeformat(settings.POST_IMAGE_MAX_BYTES)}
+        )
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            width, height = image.size
+            image_format = image.format
+    except Image.DecompressionBombError:
+        width = height = settings.POST_IMAGE_MAX_PIXELS + 1
+        image_format = None
+    except Exception:
+        # Нераспознанный файл отклонит сам ImageField с привычной ошибкой.
+        return
+    finally:
+        upload.seek(0)
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Изображение больше %(limit)s мегапикселей',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6}
+        )
+    if image_format not in settings.POST_IMAGE_UPLOAD_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается',
+            code='invalid_format',
+            params={'format': image_format}
+        )
+
+
+def ingest(upload):
+    """Уменьшает слишком большую картинку, уже прошедшую check().
+
+    Оригинал больше POST_IMAGE_MAX_SIDE уменьшается: JPEG декодируется
+    сразу в уменьшенном масштабе (draft), остальные форматы сжимаются
+    через reduce. Поэтому память на загрузку ограничена
+    POST_IMAGE_MAX_PIXELS, каким бы большим ни был файл.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if max(image.size) <= settings.POST_IMAGE_MAX_SIDE:
+            upload.seek(0)
+            return upload
+        if getattr(image, 'is_animated', False):
+            raise ValidationError(
+                'Анимация больше %(limit)s пикселей по стороне',
+                code='animation_too_large',
+                params={'limit': settings.POST_IMAGE_MAX_SIDE}
+            )
+        return _shrink(image, upload)
+
+
+def _shrink(image, upload):
+    image_format = image.format
+    options = {
+        key: image.info[key]
+        for key in ('exif', 'icc_profile')
+        if key in image.info
+    }
+    side = settings.POST_IMAGE_MAX_SIDE
+    image.thumbnail((side, side), reducing_gap=2.0)
+    if image_format == 'JPEG':
+        options.update(quality=90, optimize=True)
+        if image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, image_format, **options)
+    size = output.tell()
+    output.seek(0)
+    return InMemoryUploadedFile(
+        output, 'image', upload.name, Image.MIME[image_format], size, None
+    )
@@ -0,0 +1,308 @@
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from core import snowflake
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, shards, timeline
+from .cache import bump_generation, touch_stamps
+from .models import Comment, Follow, Group, Post, User
+from .utils import invalidate_counts
+
+# Порядок записи пачек: сначала то, на что ссылаются остальные.
+RECORD_TYPES = ('user', 'group', 'post', 'comment', 'follow')
+
+
+def open_source(path):
+    """Открывает файл импорта как текст; '-' значит stdin, .gz
+    распаковывается на лету."""
+    if path == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def guess_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'csv' if name.endswith('.csv') else 'jsonl'
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream, record_type):
+    for row in csv.DictReader(stream):
+        row.setdefault('type', record_type)
+        yield {key: value for key, value in row.items() if value != ''}
+
+
+@contextmanager
+def keep_timestamps(*models):
+    """Отключает auto_now/auto_now_add, чтобы сохранить даты источника."""
+    fields = [
+        field for model in models for field in model._meta.local_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _date(value):
+    """Дата из записи; ValueError, если её не разобрать."""
+    if not value:
+        return timezone.now()
+    value = parse_datetime(value)
+    if value is None:
+        raise ValueError('Дата не в формате ISO 8601.')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _mint(moment, shard):
+    """id записи с датой источника.
+
+    Дата раньше эпохи snowflake или в первые минуты после неё дала бы
+    id из диапазонов старых id шардов: такие записи не импортируются.
+    """
+    pk = snowflake.for_time(moment, shard)
+    if shards.is_legacy_id(pk):
+        raise ValueError(f'Дата слишком ранняя для id: {moment}.')
+    return pk
+
+
+class Importer:
+    """Потоковый импорт пользователей, групп, постов, комментариев
+    и подписок.
+
+    Записи копятся по типам и пишутся bulk_create пачками по batch_size
+    в одной транзакции на пачку. Авторы и группы разрешаются одним
+    запросом IN на пачку. bulk_create не отправляет сигналы, а то,
+    что они делают по одной строке (счётчики, ленты, кэш), выполняется
+    один раз в finish().
+
+    id постов источника не переносятся: они могут совпасть с местными.
+    Каждому посту выдаётся новый id от даты публикации, а комментарии
+    находят свой пост через post_ids — соответствие id источника новым
+    на весь импорт, по паре чисел на пост.
+    """
+
+    def __init__(self, batch_size=None, progress=None, progress_every=10000):
+        self.batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+        self.progress = progress
+        self.progress_every = progress_every
+        self.buffers = {record_type: [] for record_type in RECORD_TYPES}
+        self.written = dict.fromkeys(RECORD_TYPES, 0)
+        self.skipped = 0
+        self.rows = 0
+        self.started = time.monotonic()
+        self.authors = set()
+        self.groups = set()
+        self.commented = set()
+        self.post_ids = {}
+
+    @property
+    def rate(self) -> float:
+        return self.rows / max(time.monotonic() - self.started, 1e-6)
+
+    def run(self, records):
+        for record in records:
+            self.add(record)
+        return self.finish()
+
+    def add(self, record):
+        record_type = record.pop('type', None)
+        if record_type not in self.buffers:
+            self.skipped += 1
+            return
+        self.buffers[record_type].append(record)
+        self.rows += 1
+        if len(self.buffers[record_type]) >= self.batch_size:
+            self.flush()
+        if self.progress and self.rows % self.progress_every == 0:
+            self.progress(self)
+
+    def flush(self):
+        with ExitStack() as stack:
+            # Посты и комментарии пишутся на шарды авторов, поэтому
+            # пачка открывает транзакцию в каждой базе.
+            for alias in shards.aliases():
+                stack.enter_context(transaction.atomic(using=alias))
+            stack.enter_context(keep_timestamps(Post, Comment))
+            for record_type in RECORD_TYPES:
+                records, self.buffers[record_type] = (
+                    self.buffers[record_type], []
+                )
+                if records:
+                    getattr(self, f'_write_{record_type}s')(records)
+
+    def finish(self):
+        """Пишет остатки и делает то, что пропустили сигналы."""
+        self.flush()
+        counters.create_missing()
+        counters.reconcile_users()
+        counters.reconcile_posts()
+        authors = sorted(self.authors)
+        followers = set()
+        for start in range(0, len(authors), self.batch_size):
+            follows = Follow.objects.filter(
+                author_id__in=authors[start:start + self.batch_size]
+            ).values_list('user_id', 'author_id')
+            for user_id, author_id in follows.iterator():
+                timeline.backfill(user_id, author_id)
+                followers.add(user_id)
+        self._invalidate(followers)
+        return self
+
+    def _invalidate(self, followers):
+        """Сбрасывает кэш списков, которые задел импорт.
+
+        Карточки не сбрасываются: у новых постов новые ключи, а
+        существующие посты и пользователи импорт не меняет.
+        """
+        authors = [('author', author_id) for author_id in self.authors]
+        groups = [('group', group_id) for group_id in self.groups]
+        follows = [('follow', user_id) for user_id in followers]
+        invalidate_counts(('all',), *authors, *groups, *follows)
+        bump_generation(('posts',), *follows)
+        touch_stamps(
+            *authors, *groups,
+            *(('post', post_id) for post_id in self.commented)
+        )
+
+    def _save(self, model, objects, record_type, using=None, **options):
+        model.objects.db_manager(using).bulk_create(objects, **options)
+        self.written[record_type] += len(objects)
+
+    def _users(self, records, *fields):
+        names = {record[field] for record in records for field in fields
+                 if record.get(field)}
+        return dict(
+            User.objects.filter(username__in=names)
+            .values_list('username', 'pk')
+        )
+
+    def _write_users(self, records):
+        self._save(User, [
+            User(
+                username=record['username'],
+                first_name=record.get('first_name', ''),
+                last_name=record.get('last_name', ''),
+                email=record.get('email', ''),
+                password=record.get('password') or make_password(None),
+            )
+            for record in records
+        ], 'user', ignore_conflicts=True)
+
+    def _write_groups(self, records):
+        self._save(Group, [
+            Group(
+                slug=record['slug'],
+                title=record.get('title', record['slug']),
+                description=record.get('description', ''),
+            )
+            for record in records
+        ], 'group', ignore_conflicts=True)
+
+    def _write_posts(self, records):
+        users = self._users(records, 'author')
+        slugs = {record['group'] for record in records if record.get('group')}
+        groups = dict(
+            Group.objects.filter(slug__in=slugs).values_list('slug', 'pk')
+        )
+        posts = defaultdict(list)
+        for record in records:
+            author_id = users.get(record.get('author'))
+            if author_id is None:
+                self.skipped += 1
+                continue
+            # Запись с негодной датой пропускается одна, а не роняет
+            # транзакцию всей пачки.
+            try:
+                pub_date = _date(record.get('pub_date'))
+                edited = _date(record['edited']) if record.get(
+                    'edited'
+                ) else pub_date
+                source_id = int(record['id']) if record.get('id') else None
+                # id от даты публикации, чтобы старые посты не встали
+                # в начало лент, с номером шарда автора.
+                post_id = _mint(pub_date, shards.index_of_author(author_id))
+            except ValueError:
+                self.skipped += 1
+                continue
+            if source_id is not None:
+                self.post_ids[source_id] = post_id
+            posts[shards.for_author(author_id)].append(Post(
+                id=post_id,
+                author_id=author_id,
+                group_id=groups.get(record.get('group')),
+                text=record['text'],
+                image=record.get('image'),
+                pub_date=pub_date,
+                edited=edited,
+            ))
+            self.authors.add(author_id)
+        for alias, objects in posts.items():
+            self.groups.update(post.group_id for post in objects)
+            self._save(Post, objects, 'post', using=alias)
+        self.groups.discard(None)
+
+    def _write_comments(self, records):
+        users = self._users(records, 'author')
+        comments = defaultdict(list)
+        for record in records:
+            author_id = users.get(record.get('author'))
+            try:
+                post_id = self.post_ids.get(int(record['post']))
+                if author_id is None or post_id is None:
+                    raise ValueError('Нет автора или поста.')
+                created = _date(record.get('created'))
+                comment_id = _mint(created, shards.index_of_id(post_id))
+            except ValueError:
+                self.skipped += 1
+                continue
+            self.commented.add(post_id)
+            comments[shards.for_id(post_id)].append(Comment(
+                id=comment_id,
+                post_id=post_id,
+                author_id=author_id,
+                text=record['text'],
+                created=created,
+            ))
+        for alias, objects in comments.items():
+            self._save(Comment, objects, 'comment', using=alias)
+
+    def _write_follows(self, records):
+        users = self._users(records, 'user', 'author')
+        follows = []
+        for record in records:
+            user_id = users.get(record.get('user'))
+            author_id = users.get(record.get('author'))
+            if None in (user_id, author_id) or user_id == author_id:
+                self.skipped += 1
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+            self.authors.add(author_id)
+        self._save(Follow, follows, 'follow', ignore_conflicts=True)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые посты с комментариями и записями лент в архив '
+        'ARCHIVE_DATABASE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Переносить посты старше стольких дней '
+                 '(по умолчанию ARCHIVE_AFTER_DAYS).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько постов переносить за одну транзакцию '
+                 '(по умолчанию ARCHIVE_BATCH_SIZE).'
+        )
+
+    def handle(self, *args, **options):
+        if not archive.enabled():
+            raise CommandError('Архив выключен: задайте ARCHIVE_DATABASE')
+        moved = archive.archive_old(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено в архив постов: {moved}'
+        ))
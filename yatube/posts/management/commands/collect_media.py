@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from posts import media
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет оригиналы картинок и миниатюры, на которые больше '
+        'ничто не ссылается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int,
+            help='Не трогать файлы моложе стольких секунд '
+                 '(по умолчанию MEDIA_GC_GRACE).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько файлов проверять за один запрос '
+                 '(по умолчанию MEDIA_GC_BATCH_SIZE).'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, ничего не удалять.'
+        )
+
+    def handle(self, *args, **options):
+        collector = media.collect(
+            options['grace'], options['batch_size'], options['dry_run']
+        )
+        verb = 'Можно удалить' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено файлов: {collector.scanned}, {verb.lower()}: '
+            f'{collector.deleted}, освобождено '
+            f'{filesizeformat(collector.reclaimed)} '
+            f'({collector.reclaimed} байт)'
+        ))
@@ -0,0 +1,57 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import FORMATS, export_posts, stream
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты автора, группы или всего сайта в NDJSON или CSV '
+        '(по умолчанию в stdout).'
+    )
+
+    def add_arguments(self, parser):
+        scope = parser.add_mutually_exclusive_group()
+        scope.add_argument('--author', help='Имя пользователя автора.')
+        scope.add_argument('--group', help='Slug группы.')
+        parser.add_argument(
+            '--format', choices=tuple(FORMATS), default='ndjson',
+            help='Формат выгрузки; NDJSON читается import_content.'
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать выгрузку gzip.'
+        )
+        parser.add_argument(
+            '-o', '--output', default='-',
+            help='Файл для выгрузки, "-" пишет в stdout.'
+        )
+
+    def handle(self, *args, **options):
+        author = group = None
+        if options['author']:
+            author = User.objects.filter(username=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователь {options["author"]} не найден'
+                )
+        if options['group']:
+            group = Group.objects.filter(slug=options['group']).first()
+            if group is None:
+                raise CommandError(f'Группа {options["group"]} не найдена')
+        chunks = stream(
+            export_posts(author, group), options['format'], options['gzip']
+        )
+        if options['output'] == '-':
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
+            return
+        try:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        except OSError as error:
+            raise CommandError(error)
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует пользователей, группы, посты, комментарии и подписки '
+        'из JSONL или CSV (можно .gz, "-" читает stdin).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='+')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файлов; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--type', choices=importer.RECORD_TYPES,
+            help='Тип записей в CSV, если в нём нет колонки type.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Размер пачки bulk_create (по умолчанию IMPORT_BATCH_SIZE).'
+        )
+        parser.add_argument(
+            '--progress-every', type=int, default=10000,
+            help='Печатать прогресс каждые N записей.'
+        )
+
+    def progress(self, job):
+        self.stdout.write(
+            f'Прочитано записей: {job.rows}, {job.rate:.0f} в секунду'
+        )
+
+    def records(self, options):
+        for path in options['path']:
+            file_format = options['format'] or importer.guess_format(path)
+            try:
+                stream = importer.open_source(path)
+            except OSError as error:
+                raise CommandError(error)
+            with stream:
+                if file_format == 'csv':
+                    yield from importer.read_csv(stream, options['type'])
+                else:
+                    yield from importer.read_jsonl(stream)
+
+    def handle(self, *args, **options):
+        job = importer.Importer(
+            options['batch_size'], self.progress, options['progress_every']
+        ).run(self.records(options))
+        written = ', '.join(
+            f'{record_type}: {count}'
+            for record_type, count in job.written.items()
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Записано {written}; пропущено: {job.skipped}. '
+            f'{job.rows} записей, {job.rate:.0f} в секунду'
+        ))
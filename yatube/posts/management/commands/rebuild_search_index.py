@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов (SQLite FTS5).'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError(
+                'Полнотекстовый индекс доступен только в SQLite'
+            )
+        for db in search.search_connections():
+            search.rebuild(db)
+        self.stdout.write(self.style.SUCCESS('Индекс поиска перестроен'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок.'
+
+    def handle(self, *args, **options):
+        created = counters.create_missing()
+        users = counters.reconcile_users()
+        posts = counters.reconcile_posts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано счётчиков: {created}, исправлено пользователей: '
+            f'{users}, исправлено постов: {posts}'
+        ))
@@ -0,0 +1,133 @@
+import time
+from itertools import islice
+
+from core.models import StoredFile
+from core.storage import iter_files
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import shards
+from .models import Post
+
+
+def _batches(files, size):
+    files = iter(files)
+    while True:
+        batch = list(islice(files, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Collector:
+    """Сборщик неиспользуемых оригиналов и миниатюр.
+
+    Хранилище обходится лениво и пачками по batch_size файлов, для
+    каждой пачки ссылки проверяются одним запросом IN. Удаляются только
+    файлы старше grace секунд: так сборщик не трогает картинку, которую
+    только что загрузили, но пост с ней ещё не сохранён.
+    """
+
+    def __init__(self, grace, batch_size, dry_run=False):
+        self.deadline = time.time() - grace
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.deleted = 0
+        self.reclaimed = 0
+        # В пробном прогоне ключи KVStore не удаляются; запоминаем уже
+        # учтённые миниатюры, чтобы не посчитать их второй раз.
+        self.counted = set()
+        field = Post._meta.get_field('image')
+        self.storage = field.storage
+        self.directory = field.upload_to.rstrip('/')
+
+    def collect(self):
+        self.collect_originals()
+        self.collect_thumbnails()
+        return self
+
+    def _stale(self, files):
+        self.scanned += len(files)
+        return {
+            name: size for name, size, mtime in files
+            if mtime < self.deadline
+        }
+
+    def _delete(self, storage, name, size):
+        self.deleted += 1
+        self.reclaimed += size
+        if not self.dry_run:
+            storage.delete(name)
+
+    def collect_originals(self):
+        files = iter_files(self.storage, self.directory)
+        for batch in _batches(files, self.batch_size):
+            stale = self._stale(batch)
+            if not stale:
+                continue
+            referenced = set()
+            for posts in shards.each(
+                Post.objects.filter(image__in=stale), archived=True
+            ):
+                referenced.update(posts.values_list('image', flat=True))
+            referenced.update(
+                StoredFile.objects.filter(name__in=stale, refs__gt=0)
+                .values_list('name', flat=True)
+            )
+            orphans = [name for name in stale if name not in referenced]
+            for name in orphans:
+                self._drop_thumbnails(ImageFile(name, self.storage))
+                self._delete(self.storage, name, stale[name])
+            if orphans and not self.dry_run:
+                StoredFile.objects.filter(name__in=orphans).delete()
+
+    def _drop_thumbnails(self, source):
+        kvstore = default.kvstore
+        for key in kvstore._get(source.key, identity='thumbnails') or ():
+            thumbnail = kvstore._get(key)
+            if thumbnail is None:
+                continue
+            if thumbnail.exists() and thumbnail.name not in self.counted:
+                if self.dry_run:
+                    self.counted.add(thumbnail.name)
+                self._delete(
+                    thumbnail.storage,
+                    thumbnail.name,
+                    thumbnail.storage.size(thumbnail.name)
+                )
+            if not self.dry_run:
+                kvstore.delete(thumbnail, delete_thumbnails=False)
+        if not self.dry_run:
+            kvstore.delete(source, delete_thumbnails=False)
+
+    def collect_thumbnails(self):
+        storage = default.storage
+        prefix = sorl_settings.THUMBNAIL_PREFIX.rstrip('/')
+        for batch in _batches(iter_files(storage, prefix), self.batch_size):
+            stale = self._stale(batch)
+            if not stale:
+                continue
+            keys = {
+                add_prefix(ImageFile(name, storage).key): name
+                for name in stale
+            }
+            referenced = set(
+                KVStoreModel.objects.filter(key__in=keys)
+                .values_list('key', flat=True)
+            )
+            for key, name in keys.items():
+                if key not in referenced and name not in self.counted:
+                    self._delete(storage, name, stale[name])
+
+
+def collect(grace=None, batch_size=None, dry_run=False):
+    return Collector(
+        settings.MEDIA_GC_GRACE if grace is None else grace,
+        batch_size or settings.MEDIA_GC_BATCH_SIZE,
+        dry_run
+    ).collect()
@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-17 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_auto_20230209_1310'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'verbose_name': ('Комментарий',), 'verbose_name_plural': ('Комментарии',)},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': ('Подписка',), 'verbose_name_plural': ('Подписки',)},
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_author_user'),
+        ),
+    ]
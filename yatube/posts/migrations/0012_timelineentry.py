@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-17 22:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_timeline(apps, schema_editor):
+    if schema_editor.connection.alias != 'default':
+        # Шард или архив: подписки лежат только в default.
+        return
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    # Одна вставка INSERT ... SELECT вместо списка постов на каждую
+    # подписку. Посты авторов с подписчиками сверх лимита читаются
+    # напрямую и в ленты не копируются.
+    schema_editor.execute(
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        '(user_id, post_id, author_id, pub_date) '
+        'SELECT follow.user_id, post.id, post.author_id, post.pub_date '
+        f'FROM {Follow._meta.db_table} follow '
+        f'JOIN {Post._meta.db_table} post '
+        'ON post.author_id = follow.author_id '
+        'WHERE follow.author_id NOT IN ('
+        f'SELECT author_id FROM {Follow._meta.db_table} '
+        'GROUP BY author_id HAVING COUNT(*) > %s)',
+        [settings.TIMELINE_FANOUT_LIMIT]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_follow_unique_author_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост'),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_user_post'),
+        ),
+        migrations.RunPython(fill_timeline, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-17 22:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    if schema_editor.connection.alias != 'default':
+        # Шард или архив: данные уже лежат в default, а запросы ORM ниже
+        # роутеры отправили бы туда же.
+        return
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+
+    def totals(queryset, field):
+        return dict(
+            queryset.values_list(field).annotate(total=Count('pk')).order_by()
+        )
+
+    posts = totals(Post.objects.all(), 'author')
+    followers = totals(Follow.objects.all(), 'author')
+    following = totals(Follow.objects.all(), 'user')
+    UserCounter.objects.bulk_create(
+        [
+            UserCounter(
+                user_id=pk,
+                posts_count=posts.get(pk, 0),
+                followers_count=followers.get(pk, 0),
+                following_count=following.get(pk, 0)
+            )
+            for pk in User.objects.values_list('pk', flat=True)
+        ],
+        batch_size=500
+    )
+    for pk, total in totals(Comment.objects.all(), 'post').items():
+        Post.objects.filter(pk=pk).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0014_post_edited'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Число постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Число подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-17 22:40
+
+from django.db import migrations
+
+
+def install_index(apps, schema_editor):
+    from posts import search
+    search.rebuild(schema_editor.connection)
+
+
+def uninstall_index(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_usercounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_index, uninstall_index),
+    ]
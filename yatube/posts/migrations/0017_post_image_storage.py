@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-17 22:37
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_refs(apps, schema_editor):
+    if schema_editor.connection.alias != 'default':
+        # Шард или архив: данные уже лежат в default, а запросы ORM ниже
+        # роутеры отправили бы туда же.
+        return
+    Post = apps.get_model('posts', 'Post')
+    StoredFile = apps.get_model('core', 'StoredFile')
+    images = (
+        Post.objects.exclude(image='').exclude(image__isnull=True)
+        .values('image').annotate(refs=Count('id')).order_by()
+    )
+    StoredFile.objects.bulk_create(
+        (StoredFile(name=row['image'], refs=row['refs'])
+         for row in images.iterator()),
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('posts', '0016_post_search_index'),
+    ]
+
+    operations = [
+        # Хранилище не меняет схему: без SeparateDatabaseAndState SQLite
+        # пересоздал бы posts_post и потерял триггеры поиска.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='post',
+                    name='image',
+                    field=models.ImageField(blank=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+                ),
+            ],
+        ),
+        migrations.RunPython(count_refs, migrations.RunPython.noop),
+    ]
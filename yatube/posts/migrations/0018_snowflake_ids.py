@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-17 23:01
+
+import core.snowflake
+from django.db import migrations
+
+
+class AlterIdField(migrations.AlterField):
+    """В SQLite столбец INTEGER PRIMARY KEY уже хранит 64-битные id,
+    а настоящий ALTER пересоздал бы таблицу и снёс триггеры поиска."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'sqlite':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor != 'sqlite':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_image_storage'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='post',
+            options={'ordering': ('-pk',), 'verbose_name': ('Пост',), 'verbose_name_plural': 'Посты'},
+        ),
+        # Ленты сортируются по id, а индекс SQLite по внешнему ключу
+        # и так заканчивается rowid: (author_id, id) и (group_id, id).
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_author_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='post_group_date_idx',
+        ),
+        AlterIdField(
+            model_name='comment',
+            name='id',
+            field=core.snowflake.SnowflakeField(primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        AlterIdField(
+            model_name='post',
+            name='id',
+            field=core.snowflake.SnowflakeField(primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+    ]
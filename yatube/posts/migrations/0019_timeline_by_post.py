@@ -0,0 +1,25 @@
+# Generated by Django 2.2.16 on 2026-10-17 23:18
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_snowflake_ids'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='timelineentry',
+            options={'ordering': ('-post',), 'verbose_name': 'Запись ленты', 'verbose_name_plural': 'Записи ленты'},
+        ),
+        migrations.RemoveIndex(
+            model_name='timelineentry',
+            name='timeline_user_date_idx',
+        ),
+        migrations.RemoveField(
+            model_name='timelineentry',
+            name='pub_date',
+        ),
+    ]
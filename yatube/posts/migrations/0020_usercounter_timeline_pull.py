@@ -0,0 +1,31 @@
+# Generated by Django 2.2.16 on 2026-10-17 23:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pull_authors(apps, schema_editor):
+    if schema_editor.connection.alias != 'default':
+        # Шард или архив: данные уже лежат в default, а запросы ORM ниже
+        # роутеры отправили бы туда же.
+        return
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    UserCounter.objects.filter(
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT
+    ).update(timeline_pull=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_timeline_by_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usercounter',
+            name='timeline_pull',
+            field=models.BooleanField(default=False, verbose_name='Ленты читают посты напрямую'),
+        ),
+        migrations.RunPython(mark_pull_authors, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from core.models import CreatedModel
+from core.snowflake import SnowflakeField
+from core.storage import ContentAddressedStorage
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
@@ -6,6 +8,20 @@ from django.db import models
 User = get_user_model()
 
 
+class ShardedQuerySet(models.QuerySet):
+    """QuerySet, чей create() даёт роутеру выбрать базу по объекту.
+
+    Обычный create() сохраняет в базу запроса, выбранную без объекта,
+    и пост попал бы в default, а не на шард автора.
+    """
+
+    def create(self, **kwargs):
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
 class Group(models.Model):
     title = models.CharField(
         max_length=200,
@@ -29,6 +45,12 @@ class Group(models.Model):
 
 
 class Post(CreatedModel):
+    objects = ShardedQuerySet.as_manager()
+
+    id = SnowflakeField(
+        primary_key=True,
+        verbose_name='ID'
+    )
     text = models.TextField(
         verbose_name='Текст',
     )
@@ -49,20 +71,44 @@ class Post(CreatedModel):
     image = models.ImageField(
         verbose_name='Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True,
         null=True
     )
+    edited = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
 
     class Meta:
-        ordering = ('-pub_date'),
+        ordering = ('-pk',)
         verbose_name = 'Пост',
         verbose_name_plural = 'Посты'
+        # Сборщик медиа и генератор миниатюр ищут посты по картинке.
+        indexes = [
+            models.Index(fields=['image'], name='post_image_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:settings.POST_TEXT_LIMIT]
 
+    def id_shard(self) -> int:
+        from . import shards
+        return shards.index_of_author(self.author_id)
+
 
 class Comment(models.Model):
+    objects = ShardedQuerySet.as_manager()
+
+    id = SnowflakeField(
+        primary_key=True,
+        verbose_name='ID'
+    )
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -85,6 +131,10 @@ class Comment(models.Model):
         verbose_name = 'Комментарий',
         verbose_name_plural = 'Комментарии',
 
+    def id_shard(self) -> int:
+        from . import shards
+        return shards.index_of_id(self.post_id)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -108,3 +158,74 @@ class Follow(models.Model):
                 fields=['user', 'author'], name="unique_author_user"
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок, материализованная при публикации поста.
+
+    Лента читается по уникальному индексу (user, post): id постов
+    растут со временем, так что он же задаёт порядок ленты.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        ordering = ('-post',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_user_post'
+            )
+        ]
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Обновляются атомарно через F() в сигналах, расхождения исправляет
+    команда reconcile_counters.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        'Число постов',
+        default=0
+    )
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Число подписок',
+        default=0
+    )
+    timeline_pull = models.BooleanField(
+        'Ленты читают посты напрямую',
+        default=False
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
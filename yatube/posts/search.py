@@ -0,0 +1,205 @@
+import heapq
+import re
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.paginator import Page
+from django.db import connection, connections
+from django.utils.encoding import force_bytes
+from django.utils.http import (urlencode, urlsafe_base64_decode,
+                               urlsafe_base64_encode)
+
+from . import archive, shards
+from .models import Post
+from .utils import CursorPaginator
+
+TABLE = 'posts_post_fts'
+
+INSTALL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ai AFTER INSERT ON posts_post "
+    f"BEGIN INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_ad AFTER DELETE ON posts_post "
+    f"BEGIN INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER IF NOT EXISTS {TABLE}_au AFTER UPDATE OF text "
+    "ON posts_post "
+    f"BEGIN INSERT INTO {TABLE}({TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {TABLE}(rowid, text) VALUES (new.id, new.text); END",
+)
+UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {TABLE}_au',
+    f'DROP TABLE IF EXISTS {TABLE}',
+)
+
+
+def is_supported(db=connection) -> bool:
+    return db.vendor == 'sqlite'
+
+
+def install(db=connection):
+    """Создаёт индекс FTS5 и триггеры, которые держат его в актуальном виде.
+
+    После пересоздания таблицы posts_post (например, при ALTER в SQLite)
+    триггеры пропадают, и их нужно установить заново.
+    """
+    if not is_supported(db):
+        return
+    with db.cursor() as cursor:
+        for statement in INSTALL:
+            cursor.execute(statement)
+
+
+def uninstall(db=connection):
+    if not is_supported(db):
+        return
+    with db.cursor() as cursor:
+        for statement in UNINSTALL:
+            cursor.execute(statement)
+
+
+def rebuild(db=connection):
+    """Перестраивает индекс по текущему содержимому posts_post."""
+    install(db)
+    if not is_supported(db):
+        return
+    with db.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('rebuild')")
+
+
+def match_expression(query: str) -> str:
+    """Переводит пользовательский запрос в безопасное выражение MATCH.
+
+    Каждое слово берётся в кавычки, последнее ищется по префиксу,
+    поэтому операторы FTS5 во вводе не ломают запрос.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return ''
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matching_ids_sql():
+    return f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s'
+
+
+def encode_cursor(rank, pk) -> str:
+    return urlsafe_base64_encode(force_bytes(f'{rank!r}|{pk}'))
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        rank, pk = urlsafe_base64_decode(token).decode().split('|')
+        return float(rank), int(pk)
+    except (TypeError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def search_connections():
+    """Соединения баз, где ищутся посты: по одной на шард и архив."""
+    aliases = list(settings.POST_SHARDS)
+    if archive.enabled():
+        aliases.append(settings.ARCHIVE_DATABASE)
+    return [connections[alias] for alias in aliases]
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсорный пагинатор по релевантности (bm25, id) из индекса FTS5.
+
+    Индекс есть в каждой базе постов, включая архив, и пополняется её
+    триггерами.
+    Страница берётся с каждого шарда и сливается по (rank, id); ранги
+    bm25 считаются по статистике своего шарда, поэтому между шардами
+    они сравнимы лишь приблизительно.
+    """
+
+    def __init__(self, query, per_page, after=None, before=None):
+        super().__init__(Post.objects.none(), per_page)
+        self.match = match_expression(query)
+        self.after = decode_cursor(after)
+        self.before = None if self.after else decode_cursor(before)
+        self.token = after if self.after else before if self.before else ''
+        self.extra_query = urlencode({'q': query}) + '&'
+
+    def _ranked(self, where, params, order, descending=False):
+        sql = (
+            f'SELECT rank, id FROM (SELECT rowid AS id, rank FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s) {where} ORDER BY {order} LIMIT %s'
+        )
+        streams = []
+        for db in search_connections():
+            with db.cursor() as cursor:
+                cursor.execute(sql, [self.match, *params, self.per_page + 1])
+                streams.append([
+                    (rank, pk, db.alias) for rank, pk in cursor.fetchall()
+                ])
+        return list(islice(
+            heapq.merge(*streams, reverse=descending), self.per_page + 1
+        ))
+
+    def _posts(self, rows):
+        by_alias = defaultdict(list)
+        for _, pk, alias in rows:
+            by_alias[alias].append(pk)
+        posts = {}
+        for alias, pks in by_alias.items():
+            posts.update(shards.related(
+                Post.objects.using(alias), 'author', 'group'
+            ).in_bulk(pks))
+        return [posts[pk] for _, pk, _ in rows if pk in posts]
+
+    def get_page(self, number=None):
+        if not self.match:
+            return Page([], 1, self)
+        if self.before:
+            rank, pk = self.before
+            rows = self._ranked(
+                'WHERE rank < %s OR (rank = %s AND id < %s)',
+                [rank, rank, pk],
+                'rank DESC, id DESC',
+                descending=True
+            )
+            has_newer, has_older = len(rows) > self.per_page, True
+            rows = rows[:self.per_page][::-1]
+        else:
+            where, params = '', []
+            if self.after:
+                rank, pk = self.after
+                where = 'WHERE rank > %s OR (rank = %s AND id > %s)'
+                params = [rank, rank, pk]
+            rows = self._ranked(where, params, 'rank, id')
+            has_newer = self.after is not None
+            has_older = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+        if rows and has_older:
+            self.next_cursor = encode_cursor(*rows[-1][:2])
+        if rows and has_newer:
+            self.previous_cursor = encode_cursor(*rows[0][:2])
+        return Page(self._posts(rows), 1, self)
+
+
+def search_page(query, request, per_page):
+    """Страница результатов поиска; без FTS5 ищет через LIKE."""
+    after, before = request.GET.get('after'), request.GET.get('before')
+    if is_supported():
+        return SearchPaginator(query, per_page, after, before).get_page()
+    paginator = CursorPaginator(
+        shards.across(shards.related(
+            Post.objects.filter(text__icontains=query), 'author', 'group'
+        )),
+        per_page,
+        after=after,
+        before=before
+    )
+    paginator.extra_query = urlencode({'q': query}) + '&'
+    return paginator.get_page()
@@ -0,0 +1,199 @@
+"""Карта шардов постов.
+
+Посты, комментарии и записи лент лежат на шарде автора:
+POST_SHARDS[author_id % len(POST_SHARDS)]. Пользователи, группы,
+подписки и счётчики остаются в default. Номер шарда записан в id поста
+и комментария (core.snowflake), поэтому шард находится по одному id,
+без обращения к каталогу. Записи, созданные до snowflake-id, лежат
+в диапазонах длиной SHARD_ID_SPAN: шард k выдавал id от k * SPAN.
+
+Порядок POST_SHARDS менять нельзя: от него зависит, где лежат данные.
+С одним шардом и без архива (posts.archive) все функции возвращают
+обычные запросы к default.
+"""
+import heapq
+from itertools import islice
+
+from core import snowflake
+from django.conf import settings
+
+from . import archive
+from .models import Comment, Post, TimelineEntry
+
+SHARDED_MODELS = (Post, Comment, TimelineEntry)
+
+
+def is_sharded() -> bool:
+    return len(settings.POST_SHARDS) > 1
+
+
+def index_of_author(author_id) -> int:
+    return author_id % len(settings.POST_SHARDS)
+
+
+def is_legacy_id(pk) -> bool:
+    """id из диапазонов SHARD_ID_SPAN, выданных до snowflake-id."""
+    return int(pk) < len(settings.POST_SHARDS) * settings.SHARD_ID_SPAN
+
+
+def index_of_id(pk) -> int:
+    """Номер шарда поста или комментария по id."""
+    pk = int(pk)
+    if is_legacy_id(pk):
+        index = pk // settings.SHARD_ID_SPAN
+    else:
+        index = snowflake.shard_of(pk)
+    return index if index < len(settings.POST_SHARDS) else 0
+
+
+def for_author(author_id) -> str:
+    return settings.POST_SHARDS[index_of_author(author_id)]
+
+
+def for_id(pk) -> str:
+    return settings.POST_SHARDS[index_of_id(pk)]
+
+
+def aliases(author_id=None, pk=None, archived=False):
+    """Базы, которые задевает запись, для retry_locked(using=...).
+
+    default, шард автора или записи с id pk (без них — все шарды)
+    и, если archived, архив.
+    """
+    if author_id is not None:
+        found = [for_author(author_id)]
+    elif pk is not None:
+        found = [for_id(pk)]
+    else:
+        found = list(settings.POST_SHARDS)
+    if archived and archive.enabled():
+        found.append(settings.ARCHIVE_DATABASE)
+    return tuple(dict.fromkeys(('default', *found)))
+
+
+def objects(model, pk=None, author_id=None):
+    """Менеджер модели на шарде id или автора."""
+    if not is_sharded():
+        return model.objects
+    alias = for_id(pk) if pk is not None else for_author(author_id)
+    return model.objects.db_manager(alias)
+
+
+def related(queryset, *fields):
+    """select_related для связей с default.
+
+    На шарде и в архиве таблицы пользователей и групп пусты, поэтому
+    JOIN к ним заменяется prefetch_related: один запрос IN к default
+    на страницу.
+    """
+    if is_sharded() or archive.is_archive(queryset.db):
+        return queryset.prefetch_related(*fields)
+    return queryset.select_related(*fields)
+
+
+def each(queryset, archived=False):
+    """Копии запроса для каждого шарда и, если archived, для архива."""
+    querysets = [queryset]
+    if is_sharded():
+        querysets = [queryset.using(alias) for alias in settings.POST_SHARDS]
+    if archived and archive.enabled():
+        querysets.append(archive.archived(queryset))
+    return querysets
+
+
+def _fan_in(querysets, queryset):
+    if not archive.enabled():
+        return querysets[0] if len(querysets) == 1 else FanIn(querysets)
+    return FanIn(querysets, tail=archive.archived(queryset))
+
+
+def across(queryset):
+    """Запрос ко всем шардам сразу, дочитываемый из архива."""
+    return _fan_in(each(queryset), queryset)
+
+
+def through(queryset):
+    """Запрос к одной базе, дочитываемый из архива."""
+    return _fan_in([queryset], queryset)
+
+
+class FanIn:
+    """Запрос к нескольким шардам для пагинаторов.
+
+    Поддерживает то, чем пользуются Paginator и CursorPaginator:
+    filter, order_by, count и срезы. Срез [a:b] берёт с каждого шарда
+    первые b строк и сливает отсортированные потоки через heapq.merge,
+    так что страница курсорного пагинатора стоит по одному запросу
+    LIMIT на шард.
+
+    Архив (tail) читается, только если горячих строк на срез не хватило
+    или последняя из них не новее archive.watermark(); для порядка,
+    отличного от '-pk', — всегда.
+    """
+
+    def __init__(self, querysets, ordering=('-pk',), tail=None):
+        self.querysets = querysets
+        self.ordering = ordering
+        self.tail = tail
+        self.model = querysets[0].model
+
+    def _apply(self, method, *args, **kwargs):
+        querysets = [
+            getattr(queryset, method)(*args, **kwargs)
+            for queryset in self.querysets
+        ]
+        if self.tail is None:
+            return querysets, None
+        return querysets, getattr(self.tail, method)(*args, **kwargs)
+
+    def filter(self, *args, **kwargs):
+        querysets, tail = self._apply('filter', *args, **kwargs)
+        return FanIn(querysets, self.ordering, tail)
+
+    def order_by(self, *fields):
+        querysets, tail = self._apply('order_by', *fields)
+        return FanIn(querysets, fields, tail)
+
+    def count(self) -> int:
+        total = sum(queryset.count() for queryset in self.querysets)
+        return total + (self.tail.count() if self.tail is not None else 0)
+
+    def _key(self, obj):
+        return tuple(
+            getattr(obj, field.lstrip('-')) for field in self.ordering
+        )
+
+    def _slice(self, queryset, stop):
+        queryset = queryset.order_by(*self.ordering)
+        return queryset if stop is None else queryset[:stop]
+
+    def _merge(self, streams, stop):
+        return list(islice(
+            heapq.merge(
+                *streams,
+                key=self._key,
+                reverse=self.ordering[0].startswith('-')
+            ),
+            stop
+        ))
+
+    def _needs_tail(self, rows, stop) -> bool:
+        if self.tail is None or not archive.watermark():
+            return False
+        if self.ordering != ('-pk',) or stop is None or len(rows) < stop:
+            return True
+        return rows[-1].pk <= archive.watermark()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        rows = self._merge(
+            [self._slice(queryset, stop) for queryset in self.querysets], stop
+        )
+        if self._needs_tail(rows, stop):
+            rows = self._merge([rows, self._slice(self.tail, stop)], stop)
+        return rows[start:stop]
+
+    def __iter__(self):
+        return iter(self[0:None])
@@ -0,0 +1,147 @@
+from core import storage
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import archive, counters, timeline
+from .cache import bump_generation, touch_stamps
+from .models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                     UserCounter)
+from .utils import invalidate_counts
+
+
+def _post_listings(post, followers):
+    listings = [('all',), ('author', post.author_id)]
+    for group_id in {post.group_id, post._initial_group_id}:
+        if group_id is not None:
+            listings.append(('group', group_id))
+    listings.extend(('follow', user_id) for user_id in followers)
+    return listings
+
+
+def _post_stamps(post):
+    return (
+        ('post', post.pk),
+        ('author', post.author_id),
+        ('group', post.group_id),
+        ('group', post._initial_group_id),
+    )
+
+
+def _image_name(value):
+    return getattr(value, 'name', value) or None
+
+
+@receiver(post_save, sender=User)
+def create_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserCounter.objects.get_or_create(user=instance)
+
+
+@receiver(post_delete, sender=User)
+def delete_sharded_rows(sender, instance, **kwargs):
+    """Каскад удаления пользователя идёт только по default: его посты,
+    комментарии и записи лент на других шардах и в архиве удаляются
+    здесь, пока транзакция удаления в default ещё открыта."""
+    aliases = [alias for alias in settings.POST_SHARDS if alias != 'default']
+    if archive.enabled():
+        aliases.append(settings.ARCHIVE_DATABASE)
+    for alias in aliases:
+        TimelineEntry.objects.using(alias).filter(
+            Q(user_id=instance.pk) | Q(author_id=instance.pk)
+        ).delete()
+        Comment.objects.using(alias).filter(author_id=instance.pk).delete()
+        Post.objects.using(alias).filter(author_id=instance.pk).delete()
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._initial_group_id = instance.__dict__.get('group_id')
+    instance._initial_image = (
+        _image_name(instance.__dict__.get('image')) if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        followers = timeline.fan_out(instance)
+        counters.bump_user(instance.author_id, posts_count=1)
+    else:
+        followers = []
+    invalidate_counts(*_post_listings(instance, followers))
+    bump_generation(('posts',))
+    touch_stamps(*_post_stamps(instance))
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, raw=False, **kwargs):
+    if raw or 'image' not in instance.__dict__:
+        return
+    image = _image_name(instance.image)
+    if image == instance._initial_image:
+        return
+    storage.retain(image)
+    storage.release(instance._initial_image)
+    instance._initial_image = image
+
+
+@receiver(post_delete, sender=Post)
+def drop_post_caches(sender, instance, **kwargs):
+    storage.release(instance.image.name)
+    counters.bump_user(instance.author_id, posts_count=-1)
+    invalidate_counts(
+        *_post_listings(instance, timeline.followers_of(instance.author_id))
+    )
+    bump_generation(('posts',))
+    touch_stamps(*_post_stamps(instance))
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_comments(instance.post_id, 1)
+    touch_stamps(('post', instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    counters.bump_comments(instance.post_id, -1)
+    touch_stamps(('post', instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def drop_group_fragments(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_generation(('posts',))
+        touch_stamps(('group', instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.bump_user(instance.author_id, followers_count=1)
+        counters.bump_user(instance.user_id, following_count=1)
+        timeline.sync_pull(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        invalidate_counts(('follow', instance.user_id))
+        bump_generation(('follow', instance.user_id))
+        touch_stamps(('author', instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+    counters.bump_user(instance.author_id, followers_count=-1)
+    counters.bump_user(instance.user_id, following_count=-1)
+    timeline.sync_pull(instance.author_id)
+    invalidate_counts(('follow', instance.user_id))
+    bump_generation(('follow', instance.user_id))
+    touch_stamps(('author', instance.author_id))
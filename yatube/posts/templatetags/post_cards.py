@@ -0,0 +1,13 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.cards import refresh_card
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post):
+    if not hasattr(post, 'card_html'):
+        refresh_card(post)
+    return mark_safe(post.card_html)
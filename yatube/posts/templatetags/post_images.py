@@ -0,0 +1,19 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/post_picture.html')
+def post_picture(post, lazy=True):
+    """{% post_picture post %}: <picture> с вариантами картинки поста.
+
+    Пока варианты не готовы, показывает оригинал. Картинки ниже
+    первого экрана грузятся лениво; на странице поста lazy=False.
+    """
+    return {
+        'post': post,
+        'picture': thumbnails.picture(post),
+        'lazy': lazy,
+    }
@@ -0,0 +1,177 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from core import snowflake
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import archive, counters
+from posts.export import export_posts
+from posts.models import Comment, Follow, Post, TimelineEntry, User
+
+
+@override_settings(ARCHIVE_DATABASE='archive', POST_VIEW=1)
+class ArchiveTest(TestCase):
+    databases = {'default', 'archive'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='leo')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        old = timezone.now() - timedelta(days=400)
+        cls.old = []
+        for index in range(3):
+            post = Post.objects.create(
+                id=snowflake.for_time(old + timedelta(minutes=index)),
+                author=cls.author,
+                text=f'Старый {index}'
+            )
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий'
+            )
+            cls.old.append(post)
+        Post.objects.filter(pk__in=[post.pk for post in cls.old]).update(
+            pub_date=old
+        )
+        cls.new = [
+            Post.objects.create(author=cls.author, text=f'Новый {index}')
+            for index in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        call_command('archive_posts', '--batch-size=2', stdout=StringIO())
+
+    def test_old_posts_move_with_comments(self):
+        """Старые посты уходят в архив вместе с комментариями и лентами."""
+        old_ids = [post.pk for post in self.old]
+        self.assertFalse(Post.objects.filter(pk__in=old_ids).exists())
+        self.assertEqual(Post.objects.count(), len(self.new))
+        archived = Post.objects.using('archive')
+        self.assertEqual(
+            sorted(archived.values_list('pk', flat=True)), old_ids
+        )
+        self.assertLess(
+            archived.get(pk=old_ids[0]).pub_date,
+            timezone.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
+        )
+        self.assertEqual(Comment.objects.using('archive').count(), 3)
+        self.assertEqual(
+            TimelineEntry.objects.using('archive').filter(
+                user=self.reader
+            ).count(), 3
+        )
+
+    def test_post_detail_reads_through(self):
+        """Архивный пост открывается, но без формы комментария."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.old[0].pk])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['archived'])
+        self.assertEqual(len(response.context['comments']), 1)
+        self.assertNotContains(response, 'Добавить комментарий')
+
+    def test_feeds_continue_into_archive(self):
+        """Курсоры лент переходят с горячих постов на архивные."""
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=['leo']),
+            reverse('posts:follow_index'),
+        )
+        expected = [post.pk for post in self.new[::-1] + self.old[::-1]]
+        for url in pages:
+            with self.subTest(url=url):
+                seen, params = [], {}
+                while True:
+                    page = self.client.get(url, params).context['page_obj']
+                    seen.extend(post.pk for post in page)
+                    if not page.paginator.has_next:
+                        break
+                    params = {'after': page.paginator.next_cursor}
+                self.assertEqual(seen, expected)
+                response = self.client.get(url, {'page': 2})
+                self.assertEqual(
+                    response.context['page_obj'].paginator.count, 5
+                )
+
+    def test_counters_keep_archived_posts(self):
+        """Сверка счётчиков учитывает посты в архиве."""
+        counters.reconcile_users()
+        self.author.counters.refresh_from_db()
+        self.assertEqual(self.author.counters.posts_count, 5)
+
+    def test_first_page_skips_archive(self):
+        """Пока горячих постов хватает, архив не читается."""
+        with self.assertNumQueries(0, using='archive'):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']), self.new[-1:])
+
+    def test_search_finds_archived_posts(self):
+        """Поиск находит посты, перенесённые в архив."""
+        response = self.client.get(reverse('posts:search'), {'q': 'старый'})
+        self.assertIn(
+            response.context['page_obj'][0].pk,
+            [post.pk for post in self.old]
+        )
+
+    def test_comment_added_while_copying_is_archived(self):
+        """Комментарий, добавленный между копированием и удалением,
+        тоже попадает в архив, а не теряется."""
+        moment = timezone.now() - timedelta(days=400)
+        post = Post.objects.create(
+            id=snowflake.for_time(moment), author=self.author, text='Ещё'
+        )
+        Post.objects.filter(pk=post.pk).update(pub_date=moment)
+        copy = archive._copy
+
+        def copy_then_comment(rows, copied):
+            copy(rows, copied)
+            if not post.comments.exists():
+                Comment.objects.create(
+                    post=post, author=self.reader, text='Поздний'
+                )
+
+        with mock.patch('posts.archive._copy', copy_then_comment):
+            archive.move_batch('default', moment + timedelta(days=1), 10)
+        self.assertFalse(Comment.objects.filter(text='Поздний').exists())
+        self.assertTrue(
+            Comment.objects.using('archive').filter(text='Поздний').exists()
+        )
+
+    def test_export_includes_archived_posts(self):
+        """Выгрузка автора и всего сайта содержит и архивные посты."""
+        expected = sorted(post.pk for post in self.old + self.new)
+        for author in (self.author, None):
+            with self.subTest(author=author):
+                self.assertEqual(
+                    [row['id'] for row in export_posts(author=author)],
+                    expected
+                )
+
+    def test_new_follower_gets_archived_posts(self):
+        """Подписка раскладывает и архивные посты, отписка их убирает."""
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.author)
+        archived = TimelineEntry.objects.using('archive').filter(user=fan)
+        self.assertEqual(archived.count(), len(self.old))
+        self.client.force_login(fan)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 5)
+        Follow.objects.filter(user=fan).delete()
+        self.assertFalse(archived.exists())
+
+    def test_deleting_user_cleans_archive(self):
+        """Удаление пользователя удаляет его строки и в архиве."""
+        User.objects.get(pk=self.reader.pk).delete()
+        self.assertFalse(Comment.objects.using('archive').exists())
+        self.assertFalse(TimelineEntry.objects.using('archive').exists())
+        User.objects.get(pk=self.author.pk).delete()
+        self.assertFalse(Post.objects.using('archive').exists())
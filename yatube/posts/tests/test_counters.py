@@ -0,0 +1,73 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Post, User, UserCounter
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='TestUser')
+        self.author = User.objects.create_user(username='TestUserAuthor')
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post = Post.objects.create(
+            author=self.author,
+            text='Тестовый пост',
+        )
+
+    def counters(self, user):
+        return UserCounter.objects.get(user=user)
+
+    def test_post_and_comment_counters(self):
+        """Счётчики постов и комментариев меняются вместе с записями."""
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Тестовый комментарий'}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        Comment.objects.all().delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.post.delete()
+        self.assertEqual(self.counters(self.author).posts_count, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': self.author})
+        )
+        self.assertEqual(self.counters(self.author).followers_count, 1)
+        self.assertEqual(self.counters(self.user).following_count, 1)
+        self.authorized_client.get(
+            reverse(
+                'posts:profile_unfollow', kwargs={'username': self.author}
+            )
+        )
+        self.assertEqual(self.counters(self.author).followers_count, 0)
+        self.assertEqual(self.counters(self.user).following_count, 0)
+
+    def test_profile_reads_stored_counter(self):
+        """Профиль показывает сохранённое число постов, без COUNT."""
+        UserCounter.objects.filter(user=self.author).update(posts_count=42)
+        response = self.authorized_client.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+        self.assertContains(response, 'Всего постов: 42')
+
+    def test_reconcile_counters(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        UserCounter.objects.filter(user=self.author).update(posts_count=42)
+        UserCounter.objects.filter(user=self.user).delete()
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertEqual(self.counters(self.author).posts_count, 1)
+        self.assertEqual(self.counters(self.user).posts_count, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertIn('исправлено пользователей: 1', out.getvalue())
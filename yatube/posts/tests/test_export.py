@@ -0,0 +1,98 @@
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post, User
+
+
+@override_settings(EXPORT_CHUNK_SIZE=2)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='leo')
+        cls.other = User.objects.create_user(username='other')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.group = Group.objects.create(
+            title='Книги', slug='books', description='Про книги'
+        )
+        for index in range(5):
+            Post.objects.create(
+                author=cls.author, text=f'Пост {index}', group=cls.group
+            )
+        Post.objects.create(author=cls.other, text='Чужой пост')
+
+    def export(self, user, url, **params):
+        self.client.force_login(user)
+        return self.client.get(url, params)
+
+    def test_author_exports_own_posts(self):
+        """Автор получает свои посты в NDJSON по одной записи на строку."""
+        response = self.export(
+            self.author, reverse('posts:profile_export', args=['leo'])
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn('posts-leo.ndjson', response['Content-Disposition'])
+        records = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [record['text'] for record in records],
+            [f'Пост {index}' for index in range(5)]
+        )
+        self.assertEqual(records[0]['type'], 'post')
+        self.assertEqual(records[0]['author'], 'leo')
+        self.assertEqual(records[0]['group'], 'books')
+
+    def test_group_export_gzip_csv(self):
+        """Сжатый CSV группы распаковывается в таблицу постов."""
+        response = self.export(
+            self.staff, reverse('posts:group_export', args=['books']),
+            format='csv', gzip='1'
+        )
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        text = gzip.decompress(
+            b''.join(response.streaming_content)
+        ).decode()
+        rows = list(csv.DictReader(io.StringIO(text)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['group'], 'books')
+        self.assertEqual(rows[0]['image'], '')
+
+    def test_export_permissions(self):
+        """Чужие посты, группы и весь сайт выгружает только персонал."""
+        redirects = {
+            reverse('posts:profile_export', args=['leo']):
+                reverse('posts:profile', args=['leo']),
+            reverse('posts:group_export', args=['books']):
+                reverse('posts:group_list', args=['books']),
+            reverse('posts:export'): reverse('posts:index'),
+        }
+        for url, target in redirects.items():
+            with self.subTest(url=url):
+                self.assertRedirects(self.export(self.other, url), target)
+        response = self.export(self.staff, reverse('posts:export'))
+        self.assertEqual(len(b''.join(response.streaming_content).split(
+            b'\n'
+        )) - 1, 6)
+
+    def test_command_round_trips_through_import(self):
+        """Выгрузку команды можно загрузить обратно import_content."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'leo.jsonl.gz')
+            call_command('export_content', '--author=leo', '--gzip',
+                         '-o', path)
+            Post.objects.filter(author=self.author).delete()
+            call_command('import_content', path, stdout=io.StringIO())
+        self.assertEqual(
+            sorted(Post.objects.filter(author=self.author)
+                   .values_list('text', flat=True)),
+            [f'Пост {index}' for index in range(5)]
+        )
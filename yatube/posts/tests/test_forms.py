@@ -1,11 +1,19 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.db import connection
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from PIL import Image
+
+from core.storage import ContentAddressedStorage
 
 from posts.models import Comment, Group, Post, User
 
@@ -74,7 +82,7 @@ class PostFormTests(TestCase):
             'group': new_group.pk,
         }
         response = self.authorized_holder.post(
-            reverse('posts:post_edit', kwargs={'post_id': new_group.pk}),
+            reverse('posts:post_edit', kwargs={'post_id': new_text.pk}),
             data=form_data,
             follow=True
         )
@@ -82,7 +90,7 @@ class PostFormTests(TestCase):
             response,
             reverse(
                 'posts:post_detail',
-                kwargs={'post_id': new_group.pk}
+                kwargs={'post_id': new_text.pk}
             )
         )
         edit_post = Post.objects.first()
@@ -176,3 +184,113 @@ class PostFormTests(TestCase):
                 text='Тестовый комментарий гостя',
             ).exists()
         )
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_MAX_SIDE=100,
+    POST_IMAGE_MAX_PIXELS=400 * 400,
+    POST_IMAGE_MAX_BYTES=64 * 1024,
+)
+class ImageIngestionTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='TestUserAuthor')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    @staticmethod
+    def upload(size, image_format='JPEG', name='photo.jpg'):
+        output = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(output, image_format)
+        return SimpleUploadedFile(name, output.getvalue())
+
+    def post_image(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            {'text': 'Пост с фото', 'image': image}
+        )
+
+    def test_oversized_original_is_downscaled(self):
+        """Слишком большой оригинал уменьшается до POST_IMAGE_MAX_SIDE."""
+        self.post_image(self.upload((300, 150)))
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertEqual(image.format, 'JPEG')
+
+    def test_small_original_is_kept(self):
+        """Картинка в пределах лимита сохраняется как есть."""
+        upload = self.upload((80, 40), 'PNG', 'photo.png')
+        self.post_image(upload)
+        post = Post.objects.get(text='Пост с фото')
+        self.assertEqual(post.image.size, upload.size)
+
+    def test_limits_are_enforced(self):
+        """Лишние пиксели, байты и чужие форматы отклоняются."""
+        for upload in (
+            self.upload((500, 400)),
+            SimpleUploadedFile(
+                'big.png', self.upload((50, 50), 'PNG').read() + bytes(
+                    64 * 1024
+                )
+            ),
+            self.upload((50, 50), 'BMP', 'photo.bmp'),
+        ):
+            with self.subTest(name=upload.name):
+                response = self.post_image(upload)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertTrue(
+                    response.context['form'].has_error('image')
+                )
+        self.assertFalse(Post.objects.exists())
+
+    def test_limits_are_checked_before_verify(self):
+        """Лимит пикселей срабатывает до verify() в ImageField."""
+        with mock.patch.object(Image.Image, 'verify') as verify:
+            response = self.post_image(self.upload((500, 400)))
+        verify.assert_not_called()
+        self.assertTrue(
+            response.context['form'].has_error('image', 'too_many_pixels')
+        )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WriteLockTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(
+            User.objects.create_user(username='TestUserAuthor')
+        )
+
+    def test_only_the_write_takes_the_lock(self):
+        """Форма, картинка и GET обходятся без транзакции на запись."""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:post_create'))
+        self.assertNotIn('BEGIN IMMEDIATE', [q['sql'] for q in queries])
+        in_transaction = []
+        save = ContentAddressedStorage.save
+
+        def spy(storage, *args, **kwargs):
+            in_transaction.append(connection.in_atomic_block)
+            return save(storage, *args, **kwargs)
+
+        with mock.patch.object(ContentAddressedStorage, 'save', spy):
+            self.client.post(
+                reverse('posts:post_create'),
+                {
+                    'text': 'Пост с фото',
+                    'image': ImageIngestionTests.upload((10, 10))
+                }
+            )
+        self.assertEqual(in_transaction, [False])
+        self.assertTrue(Post.objects.get().image)
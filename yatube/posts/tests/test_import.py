@@ -0,0 +1,139 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+class ImportContentTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def run_import(self, *args):
+        out = StringIO()
+        call_command('import_content', *args, stdout=out)
+        return out.getvalue()
+
+    def test_jsonl_import(self):
+        """Импорт JSONL пишет все типы и достраивает производные данные."""
+        records = [
+            {'type': 'user', 'username': 'leo', 'first_name': 'Лев'},
+            {'type': 'user', 'username': 'fan'},
+            {'type': 'group', 'slug': 'books', 'title': 'Книги'},
+            {'type': 'post', 'id': 500, 'author': 'leo', 'group': 'books',
+             'text': 'Старый пост', 'pub_date': '2010-05-01T10:00:00+00:00'},
+            {'type': 'post', 'author': 'ghost', 'text': 'Без автора'},
+            {'type': 'comment', 'post': 500, 'author': 'fan',
+             'text': 'Отлично'},
+            {'type': 'follow', 'user': 'fan', 'author': 'leo'},
+        ]
+        path = self.write(
+            'dump.jsonl', '\n'.join(json.dumps(r) for r in records)
+        )
+        output = self.run_import(path, '--batch-size=2')
+        leo, fan = User.objects.get(username='leo'), User.objects.get(
+            username='fan'
+        )
+        post = Post.objects.get(text='Старый пост')
+        self.assertEqual(post.author, leo)
+        self.assertEqual(post.group, Group.objects.get(slug='books'))
+        self.assertEqual(post.pub_date.year, 2010)
+        self.assertEqual(post.comments_count, 1)
+        self.assertTrue(Comment.objects.filter(post=post, author=fan))
+        self.assertTrue(Follow.objects.filter(user=fan, author=leo))
+        self.assertEqual(leo.counters.posts_count, 1)
+        self.assertEqual(leo.counters.followers_count, 1)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=fan, post=post).exists()
+        )
+        self.assertFalse(leo.has_usable_password())
+        self.assertIn('пропущено: 1', output)
+
+    def test_reimport_mints_new_ids(self):
+        """Повторный импорт с теми же id не падает на конфликте id
+        и не чистит чужие ключи общего кэша."""
+        User.objects.create_user(username='leo')
+        cache.set('foreign:key', 'value')
+        path = self.write('dump.jsonl', '\n'.join(json.dumps(r) for r in [
+            {'type': 'post', 'id': 7, 'author': 'leo', 'text': 'Пост'},
+            {'type': 'comment', 'post': 7, 'author': 'leo', 'text': 'Да'},
+        ]))
+        self.run_import(path)
+        self.run_import(path)
+        posts = Post.objects.filter(text='Пост')
+        self.assertEqual(posts.count(), 2)
+        self.assertEqual(
+            [post.comments.count() for post in posts], [1, 1]
+        )
+        self.assertEqual(cache.get('foreign:key'), 'value')
+
+    def test_dates_before_epoch_are_skipped(self):
+        """Пост с датой раньше эпохи id и его комментарии пропускаются,
+        не роняя остальную пачку."""
+        User.objects.create_user(username='leo')
+        path = self.write('dump.jsonl', '\n'.join(json.dumps(r) for r in [
+            {'type': 'post', 'id': 1, 'author': 'leo', 'text': 'Древний',
+             'pub_date': '2005-01-01T00:00:00+00:00'},
+            {'type': 'post', 'id': 2, 'author': 'leo', 'text': 'Новый'},
+            {'type': 'comment', 'post': 1, 'author': 'leo', 'text': 'Да'},
+            {'type': 'comment', 'post': 2, 'author': 'leo', 'text': 'Нет',
+             'created': '2005-01-01T00:00:00+00:00'},
+        ]))
+        output = self.run_import(path)
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Новый']
+        )
+        self.assertFalse(Comment.objects.exists())
+        self.assertIn('пропущено: 3', output)
+
+    def test_bad_record_does_not_lose_batch(self):
+        """Запись с неразборчивой датой или id пропускается, остальные
+        записи пачки сохраняются."""
+        User.objects.create_user(username='leo')
+        path = self.write('dump.jsonl', '\n'.join(json.dumps(r) for r in [
+            {'type': 'post', 'author': 'leo', 'text': 'Плохая дата',
+             'pub_date': 'вчера'},
+            {'type': 'post', 'author': 'leo', 'text': 'Плохая правка',
+             'edited': '2020-13-01T00:00:00'},
+            {'type': 'post', 'id': 'x', 'author': 'leo', 'text': 'Плохой id'},
+            {'type': 'post', 'id': 5, 'author': 'leo', 'text': 'Хороший'},
+            {'type': 'comment', 'post': 5, 'author': 'leo', 'text': 'Да',
+             'created': 'никогда'},
+            {'type': 'comment', 'post': 'пять', 'author': 'leo',
+             'text': 'Нет'},
+        ]))
+        output = self.run_import(path, '--batch-size=10')
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)), ['Хороший']
+        )
+        self.assertFalse(Comment.objects.exists())
+        self.assertIn('пропущено: 5', output)
+
+    def test_csv_import(self):
+        """CSV читается с типом из --type."""
+        User.objects.create_user(username='leo')
+        path = self.write(
+            'posts.csv',
+            'author,text,pub_date\n'
+            'leo,Первый,2012-01-01T00:00:00\n'
+            'leo,Второй,\n'
+        )
+        self.run_import(path, '--type=post')
+        self.assertEqual(
+            list(Post.objects.values_list('text', flat=True)),
+            ['Второй', 'Первый']
+        )
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from core.models import StoredFile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+
+from posts import thumbnails
+from posts.models import Post, User
+from posts.tests.test_thumbnails import SMALL_GIF
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear_memory()
+        self.author = User.objects.create_user(username='TestUserAuthor')
+        self.storage = Post._meta.get_field('image').storage
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def age(self, name, storage=None):
+        hour_ago = time.time() - 3600
+        os.utime((storage or self.storage).path(name), (hour_ago, hour_ago))
+
+    def collect(self, *args):
+        out = StringIO()
+        call_command('collect_media', '--grace=60', *args, stdout=out)
+        return out.getvalue()
+
+    def test_orphans_are_collected_with_thumbnails(self):
+        """Брошенный оригинал удаляется вместе с миниатюрами."""
+        post = Post.objects.create(
+            author=self.author,
+            text='Пост',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF)
+        )
+        name = post.image.name
+        thumbnails.generate(name)
+        thumbnails.resolve_thumbnails([post])
+        made = [im for im in post.thumbnails.values() if im is not None]
+        kept = self.storage.save('posts/kept.gif', ContentFile(b'kept'))
+        Post.objects.create(author=self.author, text='Другой', image=kept)
+        post.delete()
+        for path in (name, kept):
+            self.age(path)
+        for thumbnail in made:
+            self.age(thumbnail.name, thumbnail.storage)
+        reclaimed = len(SMALL_GIF) + sum(
+            thumbnail.storage.size(thumbnail.name) for thumbnail in made
+        )
+        output = self.collect('--dry-run')
+        self.assertIn(f'можно удалить: {len(made) + 1}', output)
+        self.assertIn(f'({reclaimed} байт)', output)
+        self.assertTrue(self.storage.exists(name))
+        output = self.collect()
+        self.assertIn(f'удалено: {len(made) + 1}', output)
+        self.assertIn(f'({reclaimed} байт)', output)
+        self.assertFalse(self.storage.exists(name))
+        for thumbnail in made:
+            self.assertFalse(thumbnail.exists())
+        self.assertTrue(self.storage.exists(kept))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+
+    def test_grace_period_protects_fresh_files(self):
+        """Свежий файл без ссылок пока не трогается."""
+        name = self.storage.save('posts/new.gif', ContentFile(b'new'))
+        self.collect()
+        self.assertTrue(self.storage.exists(name))
+
+    def test_orphan_thumbnails_are_collected(self):
+        """Миниатюра, которой нет в KVStore, удаляется."""
+        storage = default.storage
+        name = storage.save('cache/ab/cd/orphan.jpg', ContentFile(b'x' * 10))
+        self.age(name, storage)
+        output = self.collect()
+        self.assertFalse(storage.exists(name))
+        self.assertIn('(10 байт)', output)
@@ -1,8 +1,15 @@
+import shutil
+import tempfile
+
+from core.models import StoredFile
 from django.conf import settings
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 
 from posts.models import Group, Post, User
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
 
 class PostModelTest(TestCase):
     @classmethod
@@ -29,3 +36,45 @@ class PostModelTest(TestCase):
             self.group.title,
             str(self.group)
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageRefsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='auth')
+
+    def create_post(self, content=b'meme'):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('meme.gif', content)
+        )
+
+    def refs(self, post):
+        return StoredFile.objects.get(name=post.image.name).refs
+
+    def test_reposts_share_one_file(self):
+        """Повторная загрузка той же картинки ссылается на тот же файл."""
+        first, second = self.create_post(), self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(self.refs(first), 2)
+        first.delete()
+        self.assertEqual(self.refs(second), 1)
+
+    def test_replacing_image_moves_reference(self):
+        """Замена картинки снимает ссылку со старого файла."""
+        post = self.create_post()
+        old = post.image.name
+        post.image = SimpleUploadedFile('new.gif', b'new')
+        post.save()
+        self.assertEqual(StoredFile.objects.get(name=old).refs, 0)
+        self.assertIsNotNone(StoredFile.objects.get(name=old).released)
+        self.assertEqual(self.refs(post), 1)
+        post.text = 'Другой текст'
+        post.save()
+        self.assertEqual(self.refs(Post.objects.get(pk=post.pk)), 1)
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.contrib.auth.models import User as AdminUser
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='TestUserAuthor')
+        cls.posts = Post.objects.bulk_create([
+            Post(author=cls.author, text=f'Пост про котов № {i}')
+            for i in range(settings.POST_VIEW + 2)
+        ])
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.dog = Post.objects.create(author=self.author, text='Собаки')
+
+    def test_search_finds_posts(self):
+        """Поиск находит посты по словам и по префиксу."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'собак'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.dog])
+
+    def test_search_is_paginated_by_cursor(self):
+        """Результаты листаются курсором и сохраняют запрос."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'котов'}
+        )
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), settings.POST_VIEW)
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82%D0%BE%D0%B2&')
+        response = self.guest_client.get(
+            reverse('posts:search'),
+            {'q': 'котов', 'after': page_obj.paginator.next_cursor}
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Триггеры обновляют индекс при изменении и удалении поста."""
+        self.dog.text = 'Кошки'
+        self.dog.save()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'Собаки'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.dog.delete()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'кошки'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_query_syntax_is_escaped(self):
+        """Операторы FTS5 во вводе не ломают поиск."""
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'котов" OR (NEAR'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_uses_search_index(self):
+        """Поиск в админке идёт через тот же индекс."""
+        admin = AdminUser.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
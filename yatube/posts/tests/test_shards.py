@@ -0,0 +1,197 @@
+from core import snowflake
+from core.db import retry_locked
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import shards
+from posts.export import export_posts
+from posts.importer import Importer
+from posts.models import (Comment, Follow, Post, TimelineEntry, User,
+                          UserCounter)
+
+SHARDS = ('default', 'shard1')
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardTest(TestCase):
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(username=f'user{i}')
+                 for i in range(2)]
+        cls.authors = {shards.for_author(user.pk): user for user in users}
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = {}
+        for index in range(3):
+            for alias, author in cls.authors.items():
+                cls.posts[alias] = Post.objects.create(
+                    author=author, text=f'{alias} {index}'
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_posts_live_on_author_shard(self):
+        """Пост пишется на шард автора, номер шарда записан в id."""
+        post = self.posts['shard1']
+        self.assertEqual(post._state.db, 'shard1')
+        self.assertEqual(snowflake.shard_of(post.pk), 1)
+        self.assertEqual(shards.for_id(post.pk), 'shard1')
+        self.assertEqual(
+            Post.objects.using('shard1').filter(
+                author=self.authors['shard1']
+            ).count(), 3
+        )
+        self.assertFalse(
+            Post.objects.using('default').filter(
+                author=self.authors['shard1']
+            ).exists()
+        )
+
+    def test_index_merges_shards(self):
+        """Главная сливает посты всех шардов по id, то есть по времени."""
+        response = self.client.get(reverse('posts:index'))
+        posts = list(response.context['page_obj'])
+        self.assertEqual(len(posts), 6)
+        self.assertEqual(
+            [post.pk for post in posts],
+            sorted((post.pk for post in posts), reverse=True)
+        )
+        self.assertEqual({post._state.db for post in posts}, set(SHARDS))
+        response = self.client.get(reverse('posts:index'), {'page': 1})
+        self.assertEqual(response.context['page_obj'].paginator.count, 6)
+
+    def test_profile_and_detail_hit_one_shard(self):
+        """Профиль и пост читают посты только с шарда автора."""
+        author = self.authors['shard1']
+        post = self.posts['shard1']
+        for url in (
+            reverse('posts:profile', args=[author.username]),
+            reverse('posts:post_detail', args=[post.pk]),
+        ):
+            with self.subTest(url=url), CaptureQueriesContext(
+                connections['default']
+            ) as default, CaptureQueriesContext(
+                connections['shard1']
+            ) as shard:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertTrue(any('posts_post' in q['sql'] for q in shard))
+            self.assertFalse(any(
+                'FROM "posts_post"' in q['sql'] for q in default
+            ))
+
+    def test_comment_and_timeline_follow_post(self):
+        """Комментарий и запись ленты ложатся на шард поста."""
+        post = self.posts['shard1']
+        self.client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': 'Привет'}
+        )
+        comment = Comment.objects.using('shard1').get(post=post)
+        self.assertEqual(shards.for_id(comment.pk), 'shard1')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.client.get(reverse(
+            'posts:profile_follow', args=[self.authors['shard1'].username]
+        ))
+        self.assertEqual(
+            TimelineEntry.objects.using('shard1').filter(
+                user=self.reader
+            ).count(), 3
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_export_search_and_import_cover_shards(self):
+        """Выгрузка, поиск и импорт работают с постами всех шардов."""
+        exported = list(export_posts())
+        self.assertEqual(len(exported), 6)
+        self.assertEqual(
+            [record['id'] for record in exported],
+            sorted(record['id'] for record in exported)
+        )
+        author = self.authors['shard1']
+        self.assertEqual(
+            {record['author'] for record in export_posts(author)},
+            {author.username}
+        )
+        response = self.client.get(reverse('posts:search'), {'q': 'shard1'})
+        self.assertEqual(len(response.context['page_obj']), 3)
+        Importer().run(
+            [{'type': 'post', 'author': author.username, 'text': 'Импорт'}]
+        )
+        post = Post.objects.using('shard1').get(text='Импорт')
+        self.assertEqual(shards.for_id(post.pk), 'shard1')
+        response = self.client.get(
+            reverse('posts:profile', args=[author.username])
+        )
+        self.assertIn(post, response.context['page_obj'])
+
+    def test_deleting_user_cleans_shards(self):
+        """Удаление пользователя удаляет его строки и на других шардах."""
+        author = self.authors['shard1']
+        Comment.objects.create(
+            post=self.posts['shard1'], author=self.reader, text='Да'
+        )
+        Follow.objects.create(user=self.reader, author=author)
+        shard = 'shard1'
+        User.objects.get(pk=self.reader.pk).delete()
+        self.assertFalse(
+            Comment.objects.using(shard).filter(text='Да').exists()
+        )
+        self.assertFalse(TimelineEntry.objects.using(shard).exists())
+        User.objects.get(pk=author.pk).delete()
+        self.assertFalse(Post.objects.using(shard).exists())
+
+
+class ShardMigrationTest(TransactionTestCase):
+    databases = set(SHARDS)
+
+    def test_migrating_shard_keeps_default_data(self):
+        """Миграции данных на новом шарде не трогают заполненный default."""
+        author = User.objects.create_user(username='leo')
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=author)
+        Post.objects.create(author=author, text='Пост')
+        counters = list(UserCounter.objects.values_list(
+            'user', 'posts_count', 'followers_count', 'following_count'
+        ))
+        call_command('migrate', 'posts', '0011', database='shard1',
+                     verbosity=0)
+        call_command('migrate', 'posts', database='shard1', verbosity=0)
+        self.assertEqual(list(UserCounter.objects.values_list(
+            'user', 'posts_count', 'followers_count', 'following_count'
+        )), counters)
+        self.assertEqual(TimelineEntry.objects.count(), 1)
+        self.assertFalse(Post.objects.using('shard1').exists())
+
+
+@override_settings(POST_SHARDS=SHARDS, SQLITE_RETRY_DELAY=0)
+class ShardWriteTest(TransactionTestCase):
+    databases = set(SHARDS)
+
+    def test_retry_rolls_back_every_shard(self):
+        """Повтор после блокировки откатывает запись во всех её базах."""
+        users = [User.objects.create_user(username=f'user{i}')
+                 for i in range(2)]
+        author = next(
+            user for user in users if shards.for_author(user.pk) == 'shard1'
+        )
+        calls = []
+
+        def write():
+            Post.objects.create(author=author, text='Пост')
+            calls.append(write)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+
+        retry_locked(write, using=shards.aliases(author_id=author.pk))()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Post.objects.using('shard1').count(), 1)
+        author.counters.refresh_from_db()
+        self.assertEqual(author.counters.posts_count, 1)
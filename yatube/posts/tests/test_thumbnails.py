@@ -0,0 +1,148 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default
+
+from core.models import Task
+from core.tasks import run_pending
+from core.thumbnails import can_save
+from posts import thumbnails
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear_memory()
+        self.author = User.objects.create_user(username='TestUserAuthor')
+        self.client = Client()
+        self.client.force_login(self.author)
+        self.post = Post.objects.create(
+            author=self.author,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif')
+        )
+
+    def ready_thumbnail(self):
+        post = Post.objects.get(pk=self.post.pk)
+        with mock.patch.object(thumbnails, 'schedule'):
+            return thumbnails.ready_thumbnail(
+                post, settings.POST_IMAGE_FALLBACK
+            )
+
+    def test_request_never_resizes(self):
+        """Страница отдаёт оригинал, пока миниатюры нет."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            response = self.client.get(
+                reverse('posts:post_detail', args=(self.post.pk,))
+            )
+        self.assertContains(response, self.post.image.url)
+        schedule.assert_called_with(self.post.image.name)
+        self.assertIsNone(
+            self.ready_thumbnail()
+        )
+
+    def test_generate_fills_thumbnail_and_card(self):
+        """Воркер создаёт миниатюру, и карточка начинает её показывать."""
+        self.assertTrue(thumbnails.generate(self.post.image.name))
+        thumbnail = self.ready_thumbnail()
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual((thumbnail.width, thumbnail.height), (960, 339))
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, thumbnail.url)
+
+    def test_card_has_responsive_picture(self):
+        """Карточка отдаёт srcset, размеры и ленивую загрузку."""
+        thumbnails.generate(self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, 'sizes="')
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertContains(response, 'loading="lazy"')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertNotContains(response, 'loading="lazy"')
+
+    def test_only_supported_formats_are_generated(self):
+        """Форматы, которых не умеет Pillow, пропускаются."""
+        thumbnails.generate(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        thumbnails.resolve_thumbnails([post])
+        for (image_format, width), thumbnail in post.thumbnails.items():
+            self.assertEqual(
+                thumbnail is not None, can_save(image_format),
+                (image_format, width)
+            )
+
+    def test_generate_is_deduplicated(self):
+        """Картинку, которую уже ресайзят, второй раз не берут."""
+        cache.add(thumbnails._lock_key(self.post.image.name), 1)
+        self.assertFalse(thumbnails.generate(self.post.image.name))
+        self.assertIsNone(
+            self.ready_thumbnail()
+        )
+
+    def test_page_is_resolved_in_one_lookup(self):
+        """Миниатюры всей страницы читаются одним запросом к KVStore."""
+        for i in range(3):
+            output = BytesIO()
+            Image.new('RGB', (4, 4), (i, 0, 0)).save(output, 'GIF')
+            Post.objects.create(
+                author=self.author,
+                text=f'Ещё пост {i}',
+                image=SimpleUploadedFile(f'{i}.gif', output.getvalue())
+            )
+        posts = list(Post.objects.all())
+        for post in posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        default.kvstore.clear_memory()
+        with self.assertNumQueries(1):
+            thumbnails.resolve_thumbnails(posts)
+        for post in posts:
+            self.assertIsNotNone(post.thumbnails[settings.POST_IMAGE_FALLBACK])
+
+    def test_upload_schedules_generation(self):
+        """Загрузка через форму ставит миниатюры в очередь."""
+        with mock.patch('posts.views.schedule_for') as schedule_for:
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile(
+                    'new.gif', SMALL_GIF, 'image/gif'
+                ),
+            })
+        post = schedule_for.call_args[0][0]
+        self.assertEqual(post.text, 'Новый пост')
+
+    def test_schedule_enqueues_task_once(self):
+        """Миниатюры создаёт воркер очереди, задача ставится один раз."""
+        thumbnails.schedule(self.post.image.name)
+        thumbnails.schedule(self.post.image.name)
+        self.assertEqual(Task.objects.count(), 1)
+        self.assertEqual(run_pending().done, 1)
+        self.assertIsNotNone(self.ready_thumbnail())
@@ -1,14 +1,22 @@
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 
-from posts.models import Follow, Group, Post, User
+from core import tasks
+from core.testing import QueryBudgetMixin
+
+from posts.cards import card_key
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.utils import CachedCountPaginator, count_cache_key
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -80,7 +88,7 @@ class PostViewTests(TestCase):
         self.assertEqual(context.text, self.post.text)
         self.assertEqual(context.group.title, self.group.title)
         self.assertEqual(context.author, self.post.author)
-        self.assertEqual(context.group.pk, self.post.pk)
+        self.assertEqual(context.group.pk, self.group.pk)
         if media is not None:
             self.assertEqual(media.image, self.post.image)
 
@@ -161,18 +169,123 @@ class CaсheTest(TestCase):
         self.REVERSE_INDEX = reverse('posts:index')
 
     def test_cache_index(self):
-        """Проверка хранения и очистки кэша для index."""
+        """Проверка хранения и сброса кэша для index по сигналам."""
         index_before = self.guest_client.get(
             self.REVERSE_INDEX
         ).content
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+        index_cached = self.guest_client.get(self.REVERSE_INDEX).content
+        self.assertEqual(index_before, index_cached)
         Post.objects.last().delete()
-        index_after = self.guest_client.get(self.REVERSE_INDEX).content
-        self.assertEqual(index_before, index_after)
-        cache.clear()
-        index_after_clear = self.guest_client.get(
+        index_after_delete = self.guest_client.get(
             self.REVERSE_INDEX
         ).content
-        self.assertNotEqual(index_before, index_after_clear)
+        self.assertNotEqual(index_before, index_after_delete)
+
+    def test_cache_follow_is_personal(self):
+        """Фрагмент ленты подписок не показывается другому читателю."""
+        reader = User.objects.create_user(username='TestReader')
+        stranger = User.objects.create_user(username='TestStranger')
+        Follow.objects.create(user=reader, author=self.author)
+        reader_client = Client()
+        reader_client.force_login(reader)
+        stranger_client = Client()
+        stranger_client.force_login(stranger)
+        reverse_follow = reverse('posts:follow_index')
+        self.assertContains(reader_client.get(reverse_follow), self.post.text)
+        self.assertNotContains(
+            stranger_client.get(reverse_follow), self.post.text
+        )
+
+
+class PostCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='TestUserAuthor')
+        self.authorized_holder = Client()
+        self.authorized_holder.force_login(self.author)
+        self.post = Post.objects.create(
+            author=self.author,
+            text='Тестовый пост'
+        )
+
+    def test_card_is_shared_between_listings(self):
+        """Карточка, отрисованная в профиле, берётся из кэша на главной."""
+        self.authorized_holder.get(
+            reverse('posts:profile', kwargs={'username': self.author})
+        )
+        key = card_key(self.post)
+        cache.set(key, '<p>карточка из кэша</p>')
+        response = self.authorized_holder.get(reverse('posts:index'))
+        self.assertContains(response, 'карточка из кэша')
+
+    def test_card_is_rebuilt_on_edit(self):
+        """Редактирование поста перестраивает его карточку."""
+        self.authorized_holder.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Исправленный пост'}
+        )
+        self.post.refresh_from_db()
+        self.assertIn('Исправленный пост', cache.get(card_key(self.post)))
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='TestUserAuthor')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            author=self.author,
+            text='Тестовый пост',
+            group=self.group
+        )
+        self.guest_client = Client()
+        self.PAGES = (
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        )
+
+    def test_unchanged_pages_return_not_modified(self):
+        """Неизменившаяся страница отдаётся как 304 без рендеринга."""
+        for url in self.PAGES:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+
+    def test_changes_refresh_validators(self):
+        """Новый комментарий и новый пост меняют валидаторы страниц."""
+        etags = {url: self.guest_client.get(url)['ETag'] for url in self.PAGES}
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий'
+        )
+        Post.objects.create(
+            author=self.author, text='Новый пост', group=self.group
+        )
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_validator_depends_on_viewer(self):
+        """ETag гостя не подходит авторизованному пользователю."""
+        url = self.PAGES[0]
+        etag = self.guest_client.get(url)['ETag']
+        authorized_client = Client()
+        authorized_client.force_login(self.author)
+        response = authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
 
 
 class PaginatorViewsTest(TestCase):
@@ -235,6 +348,55 @@ class PaginatorViewsTest(TestCase):
                     self.ADDITIONAL_POST
                 )
 
+    def test_cursor_pages_for_all(self):
+        """Курсоры ?after= и ?before= листают ленту без номеров страниц."""
+        for template in self.PUBLIC_TEMPLATES:
+            with self.subTest(template=template):
+                first = self.authorized_client.get(template)
+                paginator = first.context['page_obj'].paginator
+                self.assertFalse(paginator.has_previous)
+                second = self.authorized_client.get(
+                    template, {'after': paginator.next_cursor}
+                )
+                second_page = second.context['page_obj']
+                self.assertEqual(len(second_page), self.ADDITIONAL_POST)
+                self.assertFalse(second_page.paginator.has_next)
+                back = self.authorized_client.get(
+                    template,
+                    {'before': second_page.paginator.previous_cursor}
+                )
+                self.assertEqual(
+                    list(back.context['page_obj']),
+                    list(first.context['page_obj'])
+                )
+
+    def test_page_count_is_cached_and_invalidated(self):
+        """Число постов кэшируется и сбрасывается при новом посте."""
+        cache.clear()
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        key = count_cache_key('group', self.group.pk)
+        self.authorized_client.get(url, {'page': 1})
+        self.assertEqual(cache.get(key), Post.objects.count())
+        Post.objects.create(author=self.user, text='Ещё', group=self.group)
+        self.assertIsNone(cache.get(key))
+
+    def test_elided_page_range(self):
+        """Окно страниц не растёт вместе с числом страниц."""
+        paginator = CachedCountPaginator(list(range(1000)), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, '…', 48, 49, 50, 51, 52, '…', 100]
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'after': 'broken'}
+        )
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POST_VIEW
+        )
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -289,3 +451,188 @@ class FollowTest(TestCase):
         self.assertEqual(obj_list_follow, self.post.text)
         response = self.authorized_following.get('/follow/')
         self.assertNotEqual(response, self.post.text)
+
+    def test_timeline_fan_out_and_unfollow(self):
+        """Новый пост попадает в ленту подписчика, отписка его убирает."""
+        self.authorized_follower.get(self.REVERSE_FOLLOW)
+        new_post = Post.objects.create(
+            author=self.author,
+            text='Пост после подписки',
+        )
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(
+                    user=self.user
+                ).values_list('post', flat=True)
+            ),
+            {self.post.pk, new_post.pk}
+        )
+        self.authorized_follower.get(self.REVERSE_UNFOLLOW)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_timeline_pull_on_read(self):
+        """Посты популярного автора читаются без раскладки по лентам."""
+        self.authorized_follower.get(self.REVERSE_FOLLOW)
+        Post.objects.create(
+            author=self.author,
+            text='Пост популярного автора',
+        )
+        self.assertFalse(TimelineEntry.objects.exists())
+        response = self.authorized_follower.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_pull_feed_count_is_fresh(self):
+        """Число постов ленты с pull-авторами не залёживается в кэше."""
+        self.authorized_follower.get(self.REVERSE_FOLLOW)
+        url = reverse('posts:follow_index')
+        page = self.authorized_follower.get(url, {'page': 1}).context[
+            'page_obj'
+        ]
+        self.assertEqual(page.paginator.count, 1)
+        Post.objects.create(author=self.author, text='Ещё пост')
+        page = self.authorized_follower.get(url, {'page': 1}).context[
+            'page_obj'
+        ]
+        self.assertEqual(page.paginator.count, 2)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_timeline_materialized_below_limit(self):
+        """Посты, вышедшие без раскладки, остаются в ленте, когда
+        подписчиков снова не больше лимита."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=other, author=self.author)
+        self.authorized_follower.get(self.REVERSE_FOLLOW)
+        post = Post.objects.create(author=self.author, text='Без раскладки')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        Follow.objects.filter(user=other).delete()
+        url = reverse('posts:follow_index')
+        expected = [post, self.post]
+        page = self.authorized_follower.get(url).context['page_obj']
+        self.assertEqual(list(page), expected)
+        tasks.run_pending()
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(
+                    user=self.user
+                ).values_list('post', flat=True)
+            ),
+            {post.pk, self.post.pk}
+        )
+        self.author.counters.refresh_from_db()
+        self.assertFalse(self.author.counters.timeline_pull)
+        page = self.authorized_follower.get(url).context['page_obj']
+        self.assertEqual(list(page), expected)
+
+    @override_settings(POST_VIEW=1)
+    def test_timeline_pages_by_post_id(self):
+        """Лента листается по id записей, от новых постов к старым."""
+        self.authorized_follower.get(self.REVERSE_FOLLOW)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        url = reverse('posts:follow_index')
+        page = self.authorized_follower.get(url).context['page_obj']
+        self.assertEqual(list(page), [new_post])
+        page = self.authorized_follower.get(
+            url, {'after': page.paginator.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(page), [self.post])
+        self.assertFalse(page.paginator.has_next)
+        page = self.authorized_follower.get(url, {'page': 2}).context[
+            'page_obj'
+        ]
+        self.assertEqual((page.paginator.count, list(page)), (2, [self.post]))
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'TestAuthor{i}')
+            for i in range(settings.POST_VIEW + 3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+            cls.post = Post.objects.create(
+                author=author,
+                text=f'Пост автора {author}',
+                group=cls.group
+            )
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(QueryBudgetTest.user)
+
+    def test_views_stay_within_query_budget(self):
+        """Число запросов не зависит от числа постов и комментариев."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.authors[0]}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            for client in (self.guest_client, self.authorized_client):
+                with self.subTest(url=url, client=client):
+                    cache.clear()
+                    self.assertQueryBudget(client, url)
+
+    def test_follow_feed_budget_right_after_follow(self):
+        """Первая лента после подписки на автора, чьи посты ещё читаются
+        напрямую, укладывается в бюджет, как и лента после раскладки."""
+        author = User.objects.create_user(username='NewAuthor')
+        Post.objects.create(author=author, text='Пост нового автора')
+        author.counters.timeline_pull = True
+        author.counters.save()
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[author.username])
+        )
+        response = self.assertQueryBudget(
+            self.authorized_client, reverse('posts:follow_index')
+        )
+        self.assertContains(response, 'Пост нового автора')
+        tasks.run_pending()
+        cache.clear()
+        self.assertQueryBudget(
+            self.authorized_client, reverse('posts:follow_index')
+        )
+
+
+class TimelineMigrationTest(TransactionTestCase):
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_fill_timeline(self):
+        """Миграция заполняет ленты подписчиков, кроме популярных авторов."""
+        author, star = [User.objects.create_user(username=name)
+                        for name in ('leo', 'star')]
+        readers = [User.objects.create_user(username=f'reader{i}')
+                   for i in range(2)]
+        Follow.objects.create(user=readers[0], author=author)
+        for reader in readers:
+            Follow.objects.create(user=reader, author=star)
+        posts = [Post.objects.create(author=author, text=f'Пост {i}')
+                 for i in range(2)]
+        Post.objects.create(author=star, text='Звезда')
+        TimelineEntry.objects.all().delete()
+        call_command('migrate', 'posts', '0012_follow_unique_author_user',
+                     verbosity=0)
+        call_command('migrate', 'posts', verbosity=0)
+        self.assertEqual(
+            sorted(TimelineEntry.objects.values_list('user', 'post')),
+            sorted((readers[0].pk, post.pk) for post in posts)
+        )
@@ -0,0 +1,182 @@
+from core import tasks
+from core.thumbnails import can_save
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import tokey
+from sorl.thumbnail.images import ImageFile
+
+from . import cards, shards
+from .cache import bump_generation, touch_stamps
+from .models import Post
+
+
+def _lock_key(name) -> str:
+    return f'posts:thumb:lock:{tokey(name)}'
+
+
+def _options(source, options):
+    """Дополняет опции так же, как ThumbnailBackend.get_thumbnail.
+
+    Только так имя миниатюры совпадает с тем, что создаёт sorl.
+    """
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return backend, options
+
+
+def aliases():
+    """Варианты из THUMBNAIL_GEOMETRIES, которые умеет сохранить Pillow."""
+    return [
+        alias
+        for alias, (_, options) in settings.THUMBNAIL_GEOMETRIES.items()
+        if can_save(options.get('format', sorl_settings.THUMBNAIL_FORMAT))
+    ]
+
+
+def thumbnail_file(file_, alias):
+    """ImageFile миниатюры с тем именем, под которым её сохранит sorl."""
+    geometry, options = settings.THUMBNAIL_GEOMETRIES[alias]
+    source = ImageFile(file_)
+    backend, options = _options(source, options)
+    return ImageFile(
+        backend._get_thumbnail_filename(source, geometry, options),
+        default.storage
+    )
+
+
+def resolve_thumbnails(posts):
+    """Находит готовые миниатюры всех постов страницы за один заход.
+
+    Ключи всех картинок и геометрий читаются из KVStore одним get_many
+    (кэш и один запрос IN), результат кладётся в post.thumbnails как
+    {alias: ImageFile или None}. Недостающие миниатюры ставятся
+    в фоновую очередь, в запросе картинки никогда не ресайзятся.
+    """
+    wanted = []
+    for post in posts:
+        post.thumbnails = dict.fromkeys(settings.THUMBNAIL_GEOMETRIES)
+        if post.image:
+            wanted.extend(
+                (post, alias, thumbnail_file(post.image, alias))
+                for alias in aliases()
+            )
+    if not wanted:
+        return posts
+    kvstore = default.kvstore
+    if hasattr(kvstore, 'get_many'):
+        found = kvstore.get_many([thumbnail for _, _, thumbnail in wanted])
+    else:
+        found = {
+            thumbnail.key: kvstore.get(thumbnail)
+            for _, _, thumbnail in wanted
+        }
+    pending = {}
+    for post, alias, thumbnail in wanted:
+        post.thumbnails[alias] = found.get(thumbnail.key)
+        if post.thumbnails[alias] is None:
+            pending[post.image.name] = True
+    schedule(*pending)
+    return posts
+
+
+def ready_thumbnail(post, alias):
+    """Готовая миниатюра поста или None, пока воркер её не создал."""
+    if not hasattr(post, 'thumbnails'):
+        resolve_thumbnails([post])
+    return post.thumbnails[alias]
+
+
+def picture(post):
+    """Данные для <picture>: srcset по форматам и запасной JPEG.
+
+    Пока запасная миниатюра не готова, возвращает None, и шаблон
+    показывает оригинал.
+    """
+    fallback = ready_thumbnail(post, settings.POST_IMAGE_FALLBACK)
+    if fallback is None:
+        return None
+    srcsets = {}
+    for image_format in settings.POST_IMAGE_FORMATS:
+        widths = {}
+        for width in settings.POST_IMAGE_WIDTHS:
+            thumbnail = post.thumbnails.get((image_format, width))
+            if thumbnail is not None:
+                widths.setdefault(thumbnail.width, thumbnail.url)
+        if widths:
+            srcsets[image_format] = ', '.join(
+                f'{url} {width}w' for width, url in sorted(widths.items())
+            )
+    fallback_format = settings.POST_IMAGE_FALLBACK[0]
+    return {
+        'fallback': fallback,
+        'srcset': srcsets.pop(fallback_format, ''),
+        'sources': [
+            (f'image/{image_format.lower()}', srcset)
+            for image_format, srcset in srcsets.items()
+        ],
+        'sizes': settings.POST_IMAGE_SIZES,
+    }
+
+
+@tasks.task()
+def generate(name):
+    """Создаёт все миниатюры картинки и обновляет карточки её постов.
+
+    Блокировка в общем кэше не даёт двум воркерам ресайзить одну
+    картинку одновременно. Если картинку прочитать не удалось,
+    блокировка остаётся до истечения THUMBNAIL_LOCK_TIMEOUT, чтобы
+    каждый показ страницы не ставил её в очередь заново.
+    """
+    lock = _lock_key(name)
+    if not cache.add(lock, 1, settings.THUMBNAIL_LOCK_TIMEOUT):
+        return False
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    for alias in aliases():
+        geometry, options = settings.THUMBNAIL_GEOMETRIES[alias]
+        thumbnail = default.backend.get_thumbnail(
+            source, geometry, **options
+        )
+        if not thumbnail.exists():
+            return False
+    posts = list(shards.across(
+        shards.related(Post.objects.filter(image=name), 'author')
+    ))
+    for post in posts:
+        cards.refresh_card(post)
+    if posts:
+        bump_generation(('posts',))
+        touch_stamps(*(('post', post.pk) for post in posts))
+    cache.delete(lock)
+    return True
+
+
+def schedule(*names):
+    """Ставит создание миниатюр в очередь задач.
+
+    Картинки, которые уже кто-то ресайзит, пропускаются; блокировки
+    всех картинок проверяются одним get_many. Ключ задачи не даёт
+    поставить одну картинку дважды, пока воркер до неё не дошёл.
+    """
+    locks = {_lock_key(name): name for name in names if name}
+    if not locks:
+        return
+    busy = cache.get_many(locks)
+    pending = [name for lock, name in locks.items() if lock not in busy]
+    for name in pending:
+        generate.enqueue(name, key=f'thumbnails:{name}')
+
+
+def schedule_for(post):
+    if post.image:
+        schedule(post.image.name)
@@ -0,0 +1,327 @@
+import heapq
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from core import snowflake, tasks
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import archive, shards
+from .models import Follow, Post, TimelineEntry, UserCounter
+
+
+def _entries(user_id, posts):
+    return [
+        TimelineEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id
+        )
+        for post_id, author_id in posts
+    ]
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Если подписчиков больше TIMELINE_FANOUT_LIMIT, пост не копируется:
+    такие авторы читаются из ленты напрямую (pull-on-read).
+    Возвращает id подписчиков, в чьи ленты попал пост.
+    """
+    followers = followers_of(post.author_id)
+    shards.objects(TimelineEntry, author_id=post.author_id).bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id
+            )
+            for user_id in followers
+        ],
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    return followers
+
+
+def followers_of(author_id):
+    """Подписчики автора, если их не больше TIMELINE_FANOUT_LIMIT."""
+    if is_pull_author(author_id):
+        return []
+    return list(
+        Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    )
+
+
+def _pull(author_id=None):
+    """Счётчики авторов с pull-on-read.
+
+    Флаг timeline_pull держится, пока посты автора не разложены по
+    лентам снова (materialize), даже если подписчиков уже меньше.
+    """
+    counters = UserCounter.objects.filter(
+        Q(timeline_pull=True)
+        | Q(followers_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+    )
+    if author_id is not None:
+        counters = counters.filter(user_id=author_id)
+    return counters
+
+
+def is_pull_author(author_id) -> bool:
+    return _pull(author_id).exists()
+
+
+def sync_pull(author_id):
+    """Переключает автора между раскладкой и pull-on-read.
+
+    Вызывается после изменения числа подписчиков. Автор, перешедший
+    лимит, получает флаг timeline_pull; автору с флагом, у которого
+    подписчиков снова не больше лимита, ставится materialize.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    counters = UserCounter.objects.filter(user_id=author_id)
+    counters.filter(
+        followers_count__gt=limit, timeline_pull=False
+    ).update(timeline_pull=True)
+    if counters.filter(
+        timeline_pull=True, followers_count__lte=limit
+    ).exists():
+        materialize.enqueue(author_id, key=f'timeline:{author_id}')
+
+
+@tasks.task(queue='high')
+def materialize(author_id):
+    """Возвращает автора с pull-on-read на раскладку по лентам.
+
+    Пока флаг timeline_pull стоит, ленты читают посты автора напрямую,
+    поэтому сначала посты раскладываются всем подписчикам, потом флаг
+    снимается, а затем раскладываются посты, вышедшие за это время.
+    """
+    started = timezone.now()
+    counter = UserCounter.objects.filter(
+        user_id=author_id,
+        timeline_pull=True,
+        followers_count__lte=settings.TIMELINE_FANOUT_LIMIT
+    )
+    if not counter.exists():
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for user_id in followers.iterator():
+        backfill(user_id, author_id, force=True)
+    if not counter.update(timeline_pull=False):
+        return
+    # Часы узлов могут немного расходиться, запас в минуту безвреден:
+    # повторная запись в ленту пропускается.
+    since = snowflake.min_id(started - timedelta(minutes=1))
+    for user_id in followers.iterator():
+        backfill(user_id, author_id, since=since)
+
+
+def _fill(user_id, posts, entries):
+    batch = []
+    for row in posts.iterator(chunk_size=settings.TIMELINE_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == settings.TIMELINE_BATCH_SIZE:
+            entries.bulk_create(
+                _entries(user_id, batch), ignore_conflicts=True
+            )
+            batch = []
+    if batch:
+        entries.bulk_create(
+            _entries(user_id, batch), ignore_conflicts=True
+        )
+
+
+def backfill(user_id, author_id, since=None, force=False):
+    """Добавляет в ленту подписчика уже опубликованные посты автора.
+
+    since ограничивает посты теми, чей id не меньше него; force
+    раскладывает посты и автору с pull-on-read. Записи для постов
+    из архива пишутся в архив, рядом с записями, которые туда перенёс
+    archive_posts: remove удаляет их там же.
+    """
+    if not force and is_pull_author(author_id):
+        return
+    posts = shards.objects(Post, author_id=author_id).filter(
+        author_id=author_id
+    ).values_list('pk', 'author_id').order_by()
+    if since is not None:
+        posts = posts.filter(pk__gte=since)
+    _fill(
+        user_id, posts, shards.objects(TimelineEntry, author_id=author_id)
+    )
+    if archive.enabled() and (since is None or since <= archive.watermark()):
+        _fill(
+            user_id,
+            archive.archived(posts),
+            TimelineEntry.objects.using(settings.ARCHIVE_DATABASE)
+        )
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты подписчика посты автора после отписки."""
+    entries = shards.objects(TimelineEntry, author_id=author_id).filter(
+        user_id=user_id, author_id=author_id
+    )
+    entries.delete()
+    if archive.enabled():
+        archive.archived(entries).delete()
+
+
+def pull_authors(user_id):
+    """Авторы из подписок, чьи посты не раскладываются по лентам."""
+    return set(
+        _pull().filter(
+            user__in=Follow.objects.filter(user_id=user_id).values('author')
+        ).values_list('user_id', flat=True)
+    )
+
+
+class Timeline:
+    """Лента подписок пользователя для пагинаторов.
+
+    Страница читается из записей ленты по индексу (user, post): на
+    каждом шарде это один диапазон id без JOIN с постами и без
+    сортировки. Посты страницы затем достаются по id через in_bulk.
+    Посты авторов с pull-on-read читаются по индексу (author, id) их
+    шарда, а их записи, оставшиеся с тех пор, когда подписчиков было
+    меньше, пропускаются. Архив, как в posts.shards.FanIn, читается,
+    только если горячих id на срез не хватило.
+
+    Поддерживает то, чем пользуются пагинаторы: filter и order_by по
+    pk, count и срезы.
+    """
+    model = Post
+
+    def __init__(self, user_id, related=(), pull=None, lookups=None,
+                 ordering='-pk'):
+        self.user_id = user_id
+        self.related = related
+        self.pull = pull_authors(user_id) if pull is None else pull
+        self.lookups = lookups or {}
+        self.ordering = ordering
+
+    @property
+    def listing(self):
+        """Ключ кэша числа постов ленты.
+
+        Посты авторов с pull-on-read не раскладываются по лентам, и их
+        публикация не сбрасывает счётчики подписчиков, поэтому число
+        постов такой ленты не кэшируется.
+        """
+        return () if self.pull else ('follow', self.user_id)
+
+    def _copy(self, **changes):
+        options = {
+            'related': self.related,
+            'pull': self.pull,
+            'lookups': self.lookups,
+            'ordering': self.ordering,
+            **changes
+        }
+        return Timeline(self.user_id, **options)
+
+    def filter(self, **lookups):
+        return self._copy(lookups={**self.lookups, **lookups})
+
+    def order_by(self, ordering):
+        return self._copy(ordering=ordering)
+
+    def _querysets(self):
+        """Запросы id постов ленты, ещё не разнесённые по шардам."""
+        entries = TimelineEntry.objects.filter(
+            user_id=self.user_id,
+            **{
+                'post_id' + lookup[len('pk'):]: value
+                for lookup, value in self.lookups.items()
+            }
+        )
+        querysets = []
+        if self.pull:
+            entries = entries.exclude(author_id__in=self.pull)
+            querysets.append(
+                Post.objects.filter(
+                    author_id__in=self.pull, **self.lookups
+                ).order_by(self.ordering).values_list('pk', flat=True)
+            )
+        querysets.append(
+            entries.order_by(
+                self.ordering.replace('pk', 'post_id')
+            ).values_list('post_id', flat=True)
+        )
+        return querysets
+
+    def _hot(self):
+        return [
+            queryset
+            for base in self._querysets()
+            for queryset in shards.each(base)
+        ]
+
+    def _tail(self):
+        return [archive.archived(base) for base in self._querysets()]
+
+    def count(self) -> int:
+        querysets = self._hot()
+        if archive.enabled():
+            querysets.extend(self._tail())
+        return sum(queryset.count() for queryset in querysets)
+
+    def _merge(self, streams, stop):
+        return list(islice(
+            heapq.merge(*streams, reverse=self.ordering.startswith('-')),
+            stop
+        ))
+
+    def _read(self, querysets, stop):
+        return self._merge(
+            [
+                queryset if stop is None else queryset[:stop]
+                for queryset in querysets
+            ],
+            stop
+        )
+
+    def _needs_tail(self, ids, stop) -> bool:
+        if not archive.watermark():
+            return False
+        if self.ordering != '-pk' or stop is None or len(ids) < stop:
+            return True
+        return ids[-1] <= archive.watermark()
+
+    def _posts(self, ids, archived):
+        posts = shards.related(Post.objects.all(), *self.related)
+        hot = defaultdict(list)
+        for pk in ids:
+            if pk not in archived:
+                hot[shards.for_id(pk)].append(pk)
+        found = {}
+        for alias, pks in hot.items():
+            if shards.is_sharded():
+                found.update(posts.using(alias).in_bulk(pks))
+            else:
+                found.update(posts.in_bulk(pks))
+        if archived:
+            found.update(archive.archived(posts).in_bulk(archived))
+        return [found[pk] for pk in ids if pk in found]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        ids = self._read(self._hot(), stop)
+        archived = []
+        if self._needs_tail(ids, stop):
+            archived = self._read(self._tail(), stop)
+            ids = self._merge([ids, archived], stop)
+        return self._posts(ids[start:stop], set(archived))
+
+    def __iter__(self):
+        return iter(self[0:None])
@@ -41,6 +41,18 @@ urlpatterns = [
         name='add_comment'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.search, name='search'),
+    path('export/', views.export, name='export'),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export,
+        name='profile_export'
+    ),
+    path(
+        'group/<slug:slug>/export/',
+        views.group_export,
+        name='group_export'
+    ),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
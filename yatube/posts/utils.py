@@ -1,9 +1,180 @@
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db import DatabaseError, connection
+from django.utils.functional import cached_property
 
 
-def paginator_util(post_list, request):
-    paginator = Paginator(post_list, settings.POST_VIEW)
+def encode_cursor(post) -> str:
+    return str(post.pk)
+
+
+def decode_cursor(token):
+    """Возвращает id поста или None для битого курсора."""
+    try:
+        return int(token)
+    except (TypeError, ValueError):
+        return None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по id.
+
+    id постов растут со временем (core.snowflake), поэтому каждая
+    страница читается одним диапазонным запросом по первичному ключу,
+    без COUNT и OFFSET. Вместо номеров страниц отдаёт курсоры — id
+    крайних постов — next_cursor и previous_cursor для параметров
+    ?after= и ?before=.
+    """
+    is_cursor = True
+    extra_query = ''
+
+    def __init__(self, object_list, per_page, after=None, before=None):
+        super().__init__(object_list, per_page)
+        self.after = decode_cursor(after)
+        self.before = None if self.after else decode_cursor(before)
+        self.token = after if self.after else before if self.before else ''
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def get_page(self, number=None):
+        post_list = self.object_list
+        if self.before:
+            rows = list(
+                post_list.filter(
+                    pk__gt=self.before
+                ).order_by('pk')[:self.per_page + 1]
+            )
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_newer, has_older = has_more, True
+        else:
+            post_list = post_list.order_by('-pk')
+            if self.after:
+                post_list = post_list.filter(pk__lt=self.after)
+            rows = list(post_list[:self.per_page + 1])
+            has_older = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_newer = self.after is not None
+        if rows and has_older:
+            self.next_cursor = encode_cursor(rows[-1])
+        if rows and has_newer:
+            self.previous_cursor = encode_cursor(rows[0])
+        return Page(rows, 1, self)
+
+
+def count_cache_key(*listing) -> str:
+    return ':'.join(['posts', 'count', *map(str, listing)])
+
+
+def invalidate_counts(*listings):
+    cache.delete_many([count_cache_key(*listing) for listing in listings])
+
+
+def estimated_count(model):
+    """Оценка числа строк таблицы по статистике СУБД, без COUNT(*)."""
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [table]
+                )
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [table]
+                )
+            else:
+                return None
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+class CachedCountPaginator(Paginator):
+    """Нумерованный пагинатор, который хранит число объектов в кэше.
+
+    Ключ задаётся списком (listing) и сбрасывается сигналами Post и
+    Follow. Для всей таблицы при estimate=True используется оценка
+    из статистики СУБД, если она больше PAGINATOR_ESTIMATE_THRESHOLD.
+    """
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, listing=(), estimate=False,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = count_cache_key(*listing) if listing else None
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        if self.cache_key is None:
+            return super().count
+        count = cache.get(self.cache_key)
+        if count is not None:
+            return count
+        threshold = settings.PAGINATOR_ESTIMATE_THRESHOLD
+        if self.estimate and threshold is not None:
+            count = estimated_count(self.object_list.model)
+            if count is not None and count < threshold:
+                count = None
+        if count is None:
+            count = super().count
+        cache.set(self.cache_key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей, с многоточиями на пропусках."""
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > (1 + on_each_side + on_ends) + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < (self.num_pages - on_each_side - on_ends) - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.page_window = list(self.get_elided_page_range(page.number))
+        return page
+
+
+def paginator_util(post_list, request, listing=()):
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    if page_number is not None:
+        paginator = CachedCountPaginator(
+            post_list,
+            settings.POST_VIEW,
+            listing=listing,
+            estimate=listing == ('all',)
+        )
+        return paginator.get_page(page_number)
+    paginator = CursorPaginator(
+        post_list,
+        settings.POST_VIEW,
+        after=request.GET.get('after'),
+        before=request.GET.get('before')
+    )
+    return paginator.get_page()
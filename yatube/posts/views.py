@@ -1,31 +1,91 @@
+from core.db import retry_locked
+from core.query_budget import query_budget
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
+from . import archive, shards
+from .cache import conditional_page, fragment_context
+from .cards import attach_cards, refresh_card
+from .export import FORMATS, export_posts, stream
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import Follow, Group, Post, User
+from .search import search_page
+from .thumbnails import schedule_for
+from .timeline import Timeline
 from .utils import paginator_util
 
 
+def _group_page(slug):
+    group_id = Group.objects.filter(
+        slug=slug
+    ).values_list('pk', flat=True).first()
+    return group_id and [('group', group_id)]
+
+
+def _profile_page(username):
+    author_id = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    return author_id and [('author', author_id)]
+
+
+def _post_page(post_id):
+    row = shards.objects(Post, pk=post_id).filter(
+        pk=post_id
+    ).values_list('author_id', 'group_id').first()
+    if row is None:
+        return None
+    author_id, group_id = row
+    stamps = [('post', post_id), ('author', author_id)]
+    if group_id is not None:
+        stamps.append(('group', group_id))
+    return stamps
+
+
+@query_budget(4)
 def index(request):
-    post_list = Post.objects.select_related(
+    post_list = shards.across(shards.related(
+        Post.objects.all(),
         'group',
         'author'
-    ).prefetch_related(
-        'comments'
-    ).all()
-    page_obj = paginator_util(post_list, request)
+    ))
+    page_obj = paginator_util(post_list, request, listing=('all',))
+    attach_cards(page_obj)
     return render(
         request,
         'posts/index.html',
-        {'page_obj': page_obj}
+        {'page_obj': page_obj, **fragment_context(('posts',))}
     )
 
 
+@query_budget(4)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = search_page(query, request, settings.POST_VIEW)
+        attach_cards(page_obj)
+    return render(
+        request,
+        'posts/search.html',
+        {'page_obj': page_obj, 'query': query}
+    )
+
+
+@query_budget(5)
+@conditional_page(_group_page)
 def group_posts(request, slug: str):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paginator_util(post_list, request)
+    post_list = shards.across(
+        shards.related(group.posts.all(), 'author', 'group')
+    )
+    page_obj = paginator_util(
+        post_list, request, listing=('group', group.pk)
+    )
+    attach_cards(page_obj)
     return render(
         request,
         'posts/group_list.html',
@@ -33,10 +93,19 @@ def group_posts(request, slug: str):
     )
 
 
+@query_budget(6)
+@conditional_page(_profile_page)
 def profile(request, username: str):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    page_obj = paginator_util(post_list, request)
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    post_list = shards.through(
+        shards.related(author.posts.all(), 'author', 'group')
+    )
+    page_obj = paginator_util(
+        post_list, request, listing=('author', author.pk)
+    )
+    attach_cards(page_obj)
     if request.user.is_authenticated:
         following = Follow.objects.filter(
             user=request.user, author=author
@@ -54,17 +123,27 @@ def profile(request, username: str):
     )
 
 
+@query_budget(5)
+@conditional_page(_post_page)
 def post_detail(request, post_id: int):
-    post = get_object_or_404(Post, pk=post_id)
+    post = archive.get_post_or_404(
+        shards.related(
+            shards.objects(Post, pk=post_id).all(),
+            'author__counters',
+            'group'
+        ),
+        pk=post_id
+    )
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post)
+    comments = shards.related(post.comments.all(), 'author')
     return render(
         request,
         'posts/post_detail.html',
         {
             'post': post,
             'comments': comments,
-            'form': form
+            'form': form,
+            'archived': archive.holds(post)
         }
     )
 
@@ -90,13 +169,15 @@ def post_create(request):
 
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    form.store_image()
+    retry_locked(post.save, using=shards.aliases(author_id=post.author_id))()
+    schedule_for(post)
     return redirect('posts:profile', post.author)
 
 
 @login_required
 def post_edit(request, post_id: int):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(shards.objects(Post, pk=post_id), pk=post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id)
     form = PostForm(
@@ -115,35 +196,43 @@ def post_edit(request, post_id: int):
             }
         )
 
-    form.save()
+    form.store_image()
+    post = retry_locked(
+        form.save, using=shards.aliases(author_id=post.author_id)
+    )()
+    refresh_card(post)
+    if 'image' in form.changed_data:
+        schedule_for(post)
     return redirect('posts:post_detail', post_id)
 
 
 @login_required
 def add_comment(request, post_id: int):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(shards.objects(Post, pk=post_id), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        retry_locked(comment.save, using=shards.aliases(pk=post.pk))()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+# Пять запросов на ленту из записей и ещё один на посты авторов
+# с pull-on-read, например сразу после подписки, до materialize.
+@query_budget(6)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.select_related(
-        'group',
-        'author'
-    ).prefetch_related(
-        'comments'
-    ).filter(author__following__user=request.user)
-    page_obj = paginator_util(post_list, request)
+    post_list = Timeline(request.user.pk, related=('group', 'author'))
+    page_obj = paginator_util(post_list, request, listing=post_list.listing)
+    attach_cards(page_obj)
     return render(
         request,
         'posts/follow.html',
-        {'page_obj': page_obj}
+        {
+            'page_obj': page_obj,
+            **fragment_context(('posts',), ('follow', request.user.pk))
+        }
     )
 
 
@@ -152,7 +241,10 @@ def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
     if user != author:
-        Follow.objects.get_or_create(user=user, author=author)
+        retry_locked(
+            Follow.objects.get_or_create,
+            using=shards.aliases(author_id=author.pk, archived=True)
+        )(user=user, author=author)
     return redirect(reverse('posts:profile', args=[username]))
 
 
@@ -160,5 +252,51 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     is_follower = Follow.objects.filter(user=request.user, author=author)
-    is_follower.delete()
+    retry_locked(
+        is_follower.delete,
+        using=shards.aliases(author_id=author.pk, archived=True)
+    )()
     return redirect('posts:profile', username=author)
+
+
+def _export_response(request, name, author=None, group=None):
+    file_format = request.GET.get('format', 'ndjson')
+    if file_format not in FORMATS:
+        file_format = 'ndjson'
+    compress = request.GET.get('gzip') == '1'
+    filename = f'{name}.{file_format}'
+    content_type = FORMATS[file_format]
+    if compress:
+        # Отдаём файл .gz, а не Content-Encoding: иначе браузер
+        # распакует его сам и сохранит под неверным именем.
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(
+        stream(export_posts(author, group), file_format, compress),
+        content_type=content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    if author != request.user and not request.user.is_staff:
+        return redirect('posts:profile', username)
+    return _export_response(request, f'posts-{author.username}', author=author)
+
+
+@login_required
+def group_export(request, slug):
+    if not request.user.is_staff:
+        return redirect('posts:group_list', slug)
+    group = get_object_or_404(Group, slug=slug)
+    return _export_response(request, f'posts-{group.slug}', group=group)
+
+
+@login_required
+def export(request):
+    if not request.user.is_staff:
+        return redirect('posts:index')
+    return _export_response(request, 'posts')
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+from datetime import datetime, timezone
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +51,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,10 +93,78 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Локальная замена реплики, см. REPLICA_DATABASE.
+    'replica': {
+        'ENGINE': 'core.db',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
+    # Локальный второй шард постов. Внешние ключи на пользователей и
+    # группы ведут в default, поэтому SQLite их не проверяет.
+    'shard1': {
+        'ENGINE': 'core.db',
+        'NAME': os.path.join(BASE_DIR, 'db.shard1.sqlite3'),
+        'PRAGMAS': {'foreign_keys': 'OFF'},
+    },
+    # Архив старых постов, см. ARCHIVE_DATABASE.
+    'archive': {
+        'ENGINE': 'core.db',
+        'NAME': os.path.join(BASE_DIR, 'db.archive.sqlite3'),
+        'PRAGMAS': {'foreign_keys': 'OFF'},
+    },
+}
+DATABASE_ROUTERS = [
+    'posts.routers.ShardRouter',
+    'core.routers.ReplicaRouter',
+]
+# Безопасные запросы читают REPLICA_DATABASE. Локальную реплику
+# обновляет только sync_replica: включая её, держите запущенным
+# sync_replica --interval N. Сессии и пользователи всегда читаются
+# из default (REPLICA_PRIMARY_APPS), иначе отставшая реплика
+# разлогинит пользователя.
+# Включить реплику: REPLICA_DATABASE = 'replica'.
+REPLICA_DATABASE = None
+REPLICA_PRIMARY_APPS = ('sessions', 'auth')
+REPLICA_STICKY_COOKIE = 'read_primary'
+REPLICA_STICKY_SECONDS: int = 15
+REPLICA_SYNC_PAGES: int = 1024
+
+# Shards
+
+# Базы, где лежат посты, комментарии и ленты; шард автора —
+# POST_SHARDS[author_id % len(POST_SHARDS)]. Порядок не менять,
+# шардов не больше 16: номер шарда хранится в 4 битах id.
+# Включить второй шард: POST_SHARDS = ('default', 'shard1').
+POST_SHARDS = ('default',)
+# Базы со схемой постов: шарды и архив.
+SHARD_DATABASES = ('default', 'shard1', 'archive')
+# Диапазоны id на шардах до перехода на snowflake-id.
+SHARD_ID_SPAN: int = 10 ** 12
+
+# Ids
+
+# id постов и комментариев: время, шард, узел и счётчик (core.snowflake).
+# Узел арендуется в таблице основной базы на SNOWFLAKE_NODE_LEASE секунд;
+# процессам без общей базы задайте каждому свой SNOWFLAKE_NODE (0–63).
+SNOWFLAKE_EPOCH = datetime(2010, 1, 1, tzinfo=timezone.utc)
+SNOWFLAKE_NODE = None
+SNOWFLAKE_NODE_LEASE: int = 60 * 60
+
+# Прагмы каждого соединения с SQLite: WAL, чтобы читатели не ждали
+# писателя, и busy_timeout, чтобы писатели ждали друг друга, а не падали.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
 }
+SQLITE_WRITE_RETRIES: int = 5
+SQLITE_RETRY_DELAY: float = 0.05
 
 
 # Password validation
@@ -142,19 +212,113 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 POST_VIEW: int = 10
 POST_TEXT_LIMIT: int = 15
 
+# Fragment cache
+
+FRAGMENT_CACHE_TIMEOUT: int = 60 * 60 * 24
+POST_CARD_CACHE_TIMEOUT: int = 60 * 60 * 24
+
+# Paginator
+
+PAGINATOR_COUNT_TIMEOUT: int = 60 * 60
+PAGINATOR_ESTIMATE_THRESHOLD = None
+
+# Timeline
+
+TIMELINE_FANOUT_LIMIT: int = 1000
+TIMELINE_BATCH_SIZE: int = 500
+
+# Uploads
+
+POST_IMAGE_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+POST_IMAGE_MAX_BYTES: int = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS: int = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE: int = 2560
+
+# Import
+
+IMPORT_BATCH_SIZE: int = 1000
+
+# Archive
+
+# Посты старше ARCHIVE_AFTER_DAYS команда archive_posts переносит в
+# ARCHIVE_DATABASE; ленты и страницы постов читают их оттуда.
+# Включить архив: ARCHIVE_DATABASE = 'archive'.
+ARCHIVE_DATABASE = None
+ARCHIVE_AFTER_DAYS: int = 365
+ARCHIVE_BATCH_SIZE: int = 500
+ARCHIVE_WATERMARK_TIMEOUT: int = 60 * 60 * 24
+
+# Export
+
+EXPORT_CHUNK_SIZE: int = 2000
+
+# Tasks
+
+# Очереди от важной к фоновой; воркер берёт задачи по этому порядку.
+TASK_QUEUES = ('high', 'default', 'low')
+TASKS_EAGER: bool = False
+TASK_MAX_ATTEMPTS: int = 5
+TASK_RETRY_DELAY: int = 10
+TASK_RETRY_MAX_DELAY: int = 60 * 60
+TASK_VISIBILITY_TIMEOUT: int = 60 * 10
+TASK_POLL_INTERVAL: float = 1.0
+
+# Media garbage collection
+
+MEDIA_GC_GRACE: int = 60 * 60 * 24
+MEDIA_GC_BATCH_SIZE: int = 500
+
+# Thumbnails
+
+# Варианты картинки поста: ширины, форматы от лучшего к запасному JPEG.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_FORMATS = ('AVIF', 'WEBP', 'JPEG')
+POST_IMAGE_FALLBACK = ('JPEG', 960)
+POST_IMAGE_SIZES = '(min-width: 768px) 720px, 100vw'
+THUMBNAIL_GEOMETRIES = {
+    (image_format, width): (
+        f'{width}x{width * 339 // 960}',
+        {
+            'crop': 'center',
+            'format': image_format,
+            'upscale': (image_format, width) == POST_IMAGE_FALLBACK,
+        }
+    )
+    for image_format in POST_IMAGE_FORMATS
+    for width in POST_IMAGE_WIDTHS
+}
+THUMBNAIL_BACKEND = 'core.thumbnails.ThumbnailBackend'
+THUMBNAIL_LOCK_TIMEOUT: int = 60 * 5
+THUMBNAIL_KVSTORE = 'core.kvstore.KVStore'
+THUMBNAIL_MEMORY_ENTRIES: int = 10000
+THUMBNAIL_MEMORY_TIMEOUT: int = 60 * 5
+
 # Email
-# EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма копятся в таблице исходящих, доставляет их воркер очереди
+# через OUTBOX_EMAIL_BACKEND.
+EMAIL_BACKEND = 'core.mail.OutboxBackend'
+# OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+OUTBOX_BATCH_SIZE: int = 50
+OUTBOX_RATE: float = 10.0
+OUTBOX_MAX_ATTEMPTS: int = 8
+OUTBOX_LEASE: int = 60 * 5
 
 # Back-end of Cache
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+# Тесты чистят кэш и пишут в него, поэтому manage.py test даёт им
+# SQLiteCache во временном файле, а не общий файл сервера.
+TEST_RUNNER = 'core.testing.TestRunner'
 
 # Renames of custom views
 